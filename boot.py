@@ -1,12 +1,14 @@
-import microcontroller
 import board
 from kmk.bootcfg import bootcfg
 
+import settings
+
 storage = False
 cdc_data = False
 cdc_console = False
+nkro = bool(settings.load().flags & settings.FLAG_NKRO)
 
-if microcontroller.nvm[0] == 1: # type: ignore
+if settings.load().boot_mode == settings.BOOT_USB_WRITE:
     print("USB write mode requested")
     storage = True
     cdc_data = True
@@ -19,5 +21,6 @@ bootcfg(
     cdc_console=cdc_console,
     cdc_data=cdc_data,
     storage=storage,
+    nkro=nkro,
     usb_id=('KMK Keyboards', 'Ergo9000')
 )
\ No newline at end of file
@@ -0,0 +1,244 @@
+from kmk.modules import Module
+from kmk.scheduler import Task, cancel_task, create_task
+
+# bits per mask word, so every word stays a small int (MicroPython small ints are 31 bit signed)
+WORD_BITS = 30
+
+
+def _lowest_bit(mask):
+    index = 0
+    while not (mask >> index) & 1:
+        index += 1
+    return index
+
+
+class Combos(Module):
+    '''
+    Map sets of keys pressed together to a single action.
+
+    Combos are given as (positions, result) or (positions, result, timeout_ms), where positions are
+    indexes into the keymap / coord_mapping (0-107). At startup they are compiled into a bitmask per
+    key of the combos it belongs to, plus a bitmask per combo size, so a press only costs a couple of
+    bitwise ANDs per 30 combos, no matter which keys are involved:
+
+        candidates &= combos_containing[key]
+        complete = candidates & combos_of_size[keys_buffered]
+
+    Pressed keys are held back while they could still be part of a combo. A combo fires as soon as it
+    is complete and no larger combo is still possible, otherwise when its timeout runs out. If no combo
+    matches, the held back keys are replayed in order, followed by the event that ended the match.
+    '''
+
+    def __init__(self, combos=(), timeout_ms: int = 50, buffer_size: int = 8):
+        self.combos = list(combos)
+        self.timeout_ms = timeout_ms
+        self.buffer_size = buffer_size
+
+        self._keyboard = None
+        # one Task, rescheduled for every press, so pressing a key doesn't allocate one
+        self._task = Task(self._timeout)
+        self._scheduled = False
+        # matching state, one slot more than buffer_size for the release that ends a match
+        self._count = 0
+        self._keys = [None] * (buffer_size + 1)
+        self._coords = [0] * (buffer_size + 1)
+        self._is_pressed = bytearray(buffer_size + 1)
+
+    def compile(self, coord_mapping):
+        "Build the per-key and per-size bitmasks, and the preallocated state they index into"
+        n_coords = max(coord_mapping) + 1
+        words = self._words = max(1, (len(self.combos) + WORD_BITS - 1) // WORD_BITS)
+        # masks are flat lists of `words` words per key / size
+        self._key_masks = [0] * (n_coords * words)
+        self._key_timeouts = [0] * n_coords
+        self._size_masks = [0] * ((self.buffer_size + 1) * words)
+        self._candidates = [0] * words
+        # int_coord -> index of the fired combo it is part of, until the key is released
+        self._owner = [-1] * n_coords
+        self._results = []
+        # combos that have fired and whose result is still held
+        self._held = bytearray(len(self.combos))
+
+        for index, combo in enumerate(self.combos):
+            positions, result = combo[0], combo[1]
+            timeout = combo[2] if len(combo) > 2 else self.timeout_ms
+            if len(positions) > self.buffer_size:
+                raise ValueError(f'combo {positions} is larger than buffer_size')
+            word, bit = divmod(index, WORD_BITS)
+            bit = 1 << bit
+            for position in positions:
+                coord = coord_mapping[position]
+                self._key_masks[coord * words + word] |= bit
+                if timeout > self._key_timeouts[coord]:
+                    self._key_timeouts[coord] = timeout
+            self._size_masks[len(positions) * words + word] |= bit
+            self._results.append(result)
+
+    def _member(self, int_coord):
+        "Whether the key is part of any combo at all"
+        base = int_coord * self._words
+        for word in range(self._words):
+            if self._key_masks[base + word]:
+                return True
+        return False
+
+    def _overlaps(self, int_coord):
+        "Whether the key is part of any combo that is still a candidate"
+        base = int_coord * self._words
+        for word in range(self._words):
+            if self._candidates[word] & self._key_masks[base + word]:
+                return True
+        return False
+
+    def _narrow(self, int_coord):
+        base = int_coord * self._words
+        for word in range(self._words):
+            self._candidates[word] &= self._key_masks[base + word]
+
+    def _complete(self):
+        "Index of the first candidate combo the buffered presses complete, or -1"
+        base = self._count * self._words
+        for word in range(self._words):
+            complete = self._candidates[word] & self._size_masks[base + word]
+            if complete:
+                return word * WORD_BITS + _lowest_bit(complete)
+        return -1
+
+    def _settled(self):
+        "Whether every remaining candidate is complete, ie. no larger combo is still possible"
+        base = self._count * self._words
+        for word in range(self._words):
+            if self._candidates[word] & ~self._size_masks[base + word]:
+                return False
+        return True
+
+    def _buffer(self, key, is_pressed, int_coord):
+        self._keys[self._count] = key
+        self._coords[self._count] = int_coord
+        self._is_pressed[self._count] = is_pressed
+        self._count += 1
+
+    def _reset(self):
+        if self._scheduled:
+            cancel_task(self._task)
+            self._scheduled = False
+        for index in range(self._count):
+            self._keys[index] = None
+        self._count = 0
+        for word in range(self._words):
+            self._candidates[word] = 0
+
+    def _fire(self, index):
+        for position in range(self._count):
+            self._owner[self._coords[position]] = index
+        self._reset()
+        self._held[index] = 1
+        self._keyboard.resume_process_key(self, self._results[index], True, None)
+
+    def _replay(self):
+        count = self._count
+        self._count = 0
+        for index in range(count):
+            key = self._keys[index]
+            self._keys[index] = None
+            self._keyboard.resume_process_key(self, key, bool(self._is_pressed[index]), self._coords[index])
+        self._reset()
+
+    def _timeout(self):
+        # the task has already run, so it must not be cancelled again
+        self._scheduled = False
+        self._resolve()
+
+    def _resolve(self):
+        "Stop matching: fire the combo the buffered keys complete, if any, otherwise replay them"
+        index = self._complete()
+        if index >= 0:
+            self._fire(index)
+        else:
+            self._replay()
+
+    def _release(self, keyboard, key, int_coord):
+        index = self._owner[int_coord]
+        if index < 0:
+            return key
+        self._owner[int_coord] = -1
+        # the combo's result is released with the first of its keys
+        if self._held[index]:
+            self._held[index] = 0
+            keyboard.resume_process_key(self, self._results[index], False, None)
+        return None
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        self._keyboard = keyboard
+        self.compile(keyboard.coord_mapping)
+
+    def before_matrix_scan(self, keyboard):
+        return
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        if int_coord is None or int_coord >= len(self._owner):
+            return key
+
+        # replayed keys go out through the resume buffer, so once anything has been
+        # replayed the current event has to follow the same way, or it would overtake them
+        if not is_pressed:
+            for position in range(self._count):
+                if self._coords[position] == int_coord:
+                    # a buffered key went up before anything matched
+                    index = self._complete()
+                    if index >= 0:
+                        self._fire(index)
+                        return self._release(keyboard, key, int_coord)
+                    self._buffer(key, is_pressed, int_coord)
+                    self._replay()
+                    return None
+            return self._release(keyboard, key, int_coord)
+
+        if not self._count:
+            if not self._member(int_coord):
+                return key
+            base = int_coord * self._words
+            for word in range(self._words):
+                self._candidates[word] = self._key_masks[base + word]
+            self._buffer(key, is_pressed, int_coord)
+            create_task(self._task, after_ms=self._key_timeouts[int_coord])
+            self._scheduled = True
+            return None
+
+        if not self._overlaps(int_coord):
+            # this key can't be part of any combo with the buffered ones, so it goes back through
+            # this module after them, where it can start a combo of its own
+            self._resolve()
+            keyboard.resume_process_key(self, key, is_pressed, int_coord, reprocess=True)
+            return None
+
+        self._narrow(int_coord)
+        self._buffer(key, is_pressed, int_coord)
+        if self._settled():
+            # nothing larger is still possible, no need to wait out the timeout
+            self._fire(self._complete())
+        elif self._count == self.buffer_size:
+            self._resolve()
+        return None
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        return
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
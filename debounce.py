@@ -0,0 +1,108 @@
+import keypad
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_add, ticks_diff
+from kmk.scanners import DiodeOrientation, Scanner
+
+# the scanner of the running keyboard, so its stats can be read from the REPL (see u.chatter())
+active = None
+
+
+class EagerMatrixScanner(Scanner):
+    '''
+    Matrix scanner with eager (press on first edge) per-key debounce.
+
+    keypad.KeyMatrix is run at a short scan interval and every edge it reports is passed on
+    immediately. After reporting an edge, a key is locked for its debounce window: further edges
+    inside the window are counted as chatter and dropped. When the window closes, the key's
+    latest raw state is reported if it differs from what was last reported.
+
+    `windows` maps matrix coordinates (the values in Ergo9000.coord_mapping, not keymap positions)
+    to a debounce window in ms, any key not listed uses `window_ms`.
+    '''
+
+    def __init__(
+        self,
+        column_pins,
+        row_pins,
+        columns_to_anodes=DiodeOrientation.COL2ROW,
+        interval=0.001,
+        window_ms: int = 5,
+        windows: dict[int, int] | None = None,
+        max_events=64,
+    ):
+        self.keypad = keypad.KeyMatrix(
+            row_pins,
+            column_pins,
+            columns_to_anodes=(columns_to_anodes == DiodeOrientation.COL2ROW),
+            interval=interval,
+            max_events=max_events,
+        )
+        count = self.keypad.key_count
+        self.window_ms = window_ms
+        self.windows = windows or {}
+        # per key state, preallocated so scanning never allocates
+        self._raw = bytearray(count)
+        self._reported = bytearray(count)
+        self._locked = bytearray(count)
+        self._deadline = [0] * count
+        self._n_locked = 0
+        self._event = keypad.Event()
+        self.chatter = [0] * count
+
+    @property
+    def key_count(self):
+        return self.keypad.key_count
+
+    def _report(self, key_number, pressed, now):
+        self._reported[key_number] = pressed
+        if not self._locked[key_number]:
+            self._locked[key_number] = 1
+            self._n_locked += 1
+        # windows are looked up by coord here rather than in __init__,
+        # because the split module only sets our offset after construction
+        window = self.windows.get(key_number + self.offset, self.window_ms)
+        self._deadline[key_number] = ticks_add(now, window)
+        return keypad.Event(key_number + self.offset, pressed)
+
+    def scan_for_changes(self):
+        now = ticks_ms()
+
+        # release any key whose debounce window has closed, reporting its settled state if it changed
+        if self._n_locked:
+            for key_number in range(len(self._locked)):
+                if not self._locked[key_number] or ticks_diff(self._deadline[key_number], now) > 0:
+                    continue
+                self._locked[key_number] = 0
+                self._n_locked -= 1
+                if self._raw[key_number] != self._reported[key_number]:
+                    return self._report(key_number, self._raw[key_number], now)
+
+        event = self._event
+        while self.keypad.events.get_into(event):
+            key_number = event.key_number
+            self._raw[key_number] = event.pressed
+            if self._locked[key_number]:
+                self.chatter[key_number] += 1
+                continue
+            if event.pressed != self._reported[key_number]:
+                return self._report(key_number, event.pressed, now)
+        return None
+
+    def chatter_report(self, coord_mapping=None):
+        '''
+        Return (coord, chatter count) for every key that has chattered, worst first.
+        With `coord_mapping`, keys are given by keymap position instead of coord.
+        '''
+        report = [
+            (key_number + self.offset, count)
+            for key_number, count in enumerate(self.chatter)
+            if count
+        ]
+        if coord_mapping is not None:
+            report = [(coord_mapping.index(coord), count) for coord, count in report]
+        report.sort(key=lambda item: -item[1])
+        return report
+
+    def deinit(self):
+        self.keypad.deinit()
@@ -1,19 +1,25 @@
 import board
-import microcontroller
+import gc
 import displayio
 from vectorio import Rectangle
 from typing import TYPE_CHECKING
-from terminalio import FONT
+import terminalio
 from displayio import I2CDisplay # type: ignore
+from supervisor import ticks_ms
 
 from adafruit_display_text.label import Label
 from adafruit_displayio_ssd1306 import SSD1306
 
-from kmk.keys import KC, Key
 from kmk.modules import Module
+from kmk.kmktime import ticks_diff
 from kmk.scheduler import create_task
 from kmk.utils import Debug
 
+import glyphs
+import settings
+from gc_scheduler import tracked
+from governor import MODE_NAMES
+
 if TYPE_CHECKING:
     from kb import Ergo9000
 
@@ -24,11 +30,20 @@ BLACK[0] = 0x000000
 WHITE = displayio.Palette(1)
 WHITE[0] = 0xFFFFFF
 
-BITMAP = displayio.OnDiskBitmap(open("glyphs-i.bmp", "rb"))
+BITMAP = displayio.OnDiskBitmap(open(glyphs.SHEET, "rb"))
+
+if glyphs.FONT:
+    from adafruit_bitmap_font import bitmap_font
+
+    FONT = bitmap_font.load_font(glyphs.FONT)
+    # only the subset in the file is available, load it all up front so lookups never hit flash
+    FONT.load_glyphs(range(32, 127))
+else:
+    FONT = terminalio.FONT
 
 class State:
     layer = 0
-    if microcontroller.nvm[0] == 0:  # type: ignore
+    if settings.load().boot_mode == settings.BOOT_NORMAL:
         boot_mode = "RO"
     else:
         boot_mode = "RW"
@@ -42,23 +57,24 @@ class State:
 
 class Glyphs:
     @staticmethod
-    def create(index, x=0, y=0):
+    def create(name, x=0, y=0):
         return displayio.TileGrid(
             BITMAP,
             pixel_shader=BITMAP.pixel_shader,
-            tile_width=12,
-            tile_height=12,
-            default_tile=index,
+            tile_width=glyphs.TILE,
+            tile_height=glyphs.TILE,
+            default_tile=glyphs.INDEX[name],
             x=x,
             y=y,
         )
-    ctrl = 0
-    alt = 1
-    shift = 2
-    gui = 3
-    win = 4
-    mac = 5
-    con = 6
+    # tile indexes, resolved by name once so the display update path only deals in ints
+    ctrl = glyphs.INDEX['ctrl']
+    alt = glyphs.INDEX['alt']
+    shift = glyphs.INDEX['shift']
+    gui = glyphs.INDEX['gui']
+    win = glyphs.INDEX['win']
+    mac = glyphs.INDEX['mac']
+    con = glyphs.INDEX['con']
 
 
 def outline_box(group: displayio.Group, width: int, height: int, border: int = 1):
@@ -96,37 +112,44 @@ def boxed_text(
     )
     group.append(text_area)
 
-def boxed_glyphs(group: displayio.Group, glyph_ids: list[int], border: int = 1, padding: int = 1):
+def boxed_glyphs(group: displayio.Group, glyph_names: list[str], border: int = 1, padding: int = 1):
     "Render a box with glyphs in it, returning the x or y coordinates of the next box"
-    glyph_height = 12
-    width = (len(glyph_ids) * 12) + (padding * 2) + (border * 2)
+    glyph_height = glyphs.TILE
+    width = (len(glyph_names) * glyphs.TILE) + (padding * 2) + (border * 2)
     height = glyph_height + (padding * 2) + (border * 2)
     
     outline_box(group, width, height, border)
     offset = border + padding
-    for _id in glyph_ids:
-        glyph = Glyphs.create(_id, x=offset, y=border + padding)
-        offset += 12
+    for name in glyph_names:
+        glyph = Glyphs.create(name, x=offset, y=border + padding)
+        offset += glyphs.TILE
         group.append(glyph)
 
+# Layer names, pre-centered to the 18 char width of the layer box so rendering them doesn't allocate
+LAYER_NAMES = tuple(f"{name:^18}" for name in ('Base', 'Lower', 'Raise', 'Adjust'))
+UNKNOWN_LAYER = f"{'Unknown':^18}"
+
+@tracked('layer_text')
 def layer_text(active_layer):
     "Render the layer name"
-    layer_map = {
-        0: 'Base',
-        1: 'Lower',
-        2: 'Raise',
-        3: 'Adjust',
-    }
-    layer_name = layer_map.get(active_layer, 'Unknown')
-    return f"{layer_name:^18}"
+    if 0 <= active_layer < len(LAYER_NAMES):
+        return LAYER_NAMES[active_layer]
+    return UNKNOWN_LAYER
+
+HUD_LINES = 5
 
 class Display(Module):
-    "Display the current layer and mods"
+    "Display the current layer and mods, or a live performance HUD"
 
     def __init__(self, kb: 'Ergo9000', refresh_rate: int = 10):
         self.kb = kb
         self.refresh_rate = refresh_rate
         self.prev_state = None
+        self.hud_active = False
+        self._hud_text = [""] * HUD_LINES
+        self._hud_next = 0
+        # how long the last update took, in ms, including pushing the frame to the display
+        self.refresh_ms = 0
 
 
     def create_layout(self):
@@ -139,13 +162,13 @@ class Display(Module):
         row_2 = displayio.Group(y=27)
         mods_group = displayio.Group()
         row_2.append(mods_group)
-        boxed_glyphs(mods_group, [Glyphs.ctrl, Glyphs.alt, Glyphs.shift, Glyphs.gui], border=2, padding=2)
+        boxed_glyphs(mods_group, ['ctrl', 'alt', 'shift', 'gui'], border=2, padding=2)
         debug_group = displayio.Group(x=52)
         row_2.append(debug_group)
-        boxed_glyphs(debug_group, [Glyphs.con], border=2, padding=2)
+        boxed_glyphs(debug_group, ['con'], border=2, padding=2)
         os_group = displayio.Group(x=68)
         row_2.append(os_group)
-        boxed_glyphs(os_group, [Glyphs.mac], border=2, padding=2)
+        boxed_glyphs(os_group, ['mac'], border=2, padding=2)
         boot_mode_group = displayio.Group(x=84)
         row_2.append(boot_mode_group)
         boxed_text(boot_mode_group, State.boot_mode, width=44, border=2, padding=2)
@@ -163,11 +186,66 @@ class Display(Module):
         self.os: displayio.TileGrid = os_group[-1] # type: ignore
         self.boot_mode: Label = boot_mode_group[-1] # type: ignore
         self.msg: Label = msg_group[-1] # type: ignore
-    
+
+    def create_hud_layout(self):
+        "Create the performance HUD page, one label per line, so each line can be updated on its own"
+        self.hud = displayio.Group()
+        self.hud_lines: list[Label] = []
+        for line in range(HUD_LINES):
+            label = Label(font=FONT, text="", color=WHITE[0], x=2, y=6 + line * 13)  # type: ignore
+            self.hud.append(label)
+            self.hud_lines.append(label)
+
+    def toggle_hud(self):
+        "Switch between the main page and the performance HUD"
+        self.hud_active = not self.hud_active
+        if self.hud_active:
+            # make the next HUD tick count as a change, so the new page gets pushed to the display
+            for line in range(HUD_LINES):
+                self._hud_text[line] = ""
+            self.driver.root_group = self.hud
+        else:
+            # force a full redraw of the main page
+            self.prev_state = None
+            self.driver.root_group = self.root
+
+    def _hud_line(self, line):
+        if line == 0:
+            return f"scan {self.kb.perf.scan_hz:>5} Hz {MODE_NAMES[self.kb.governor.mode]}"
+        if line == 1:
+            return f"loop {self.kb.perf.worst_loop_ms:>6} ms max"
+        if line == 2:
+            return f"free {gc.mem_free():>6} B"
+        if line == 3:
+            rtt = self.kb.split_link.rtt_ms
+            return f"link {rtt:>6} ms rtt" if rtt >= 0 else "link     -- ms rtt"
+        return f"disp {self.refresh_ms:>6} ms"
+
+    def _update_hud(self):
+        "Refresh a single HUD line per tick, and only touch its label if the text changed"
+        line = self._hud_next
+        self._hud_next = (line + 1) % HUD_LINES
+        if line == 0:
+            self.kb.split_link.ping()
+        text = self._hud_line(line)
+        if text == self._hud_text[line]:
+            return False
+        self._hud_text[line] = text
+        self.hud_lines[line].text = text
+        return True
+
+    def _refresh(self):
+        start = ticks_ms()
+        changed = self._update_hud() if self.hud_active else self._update_layout()
+        if changed:
+            # auto_refresh is off, so the I2C transfer happens here, where it can be timed
+            self.driver.refresh(target_frames_per_second=None)
+        self.refresh_ms = ticks_diff(ticks_ms(), start)
+
     def _update_layout(self):
-        "Update the display layout with the current state"
+        "Update the display layout with the current state, returns whether anything changed"
         if State.__dict__ == self.prev_state:
-            return
+            return False
         self.layer.text = layer_text(State.layer)
         self.ctrl.hidden = not State.ctrl
         self.alt.hidden = not State.alt
@@ -183,6 +261,7 @@ class Display(Module):
         self.boot_mode.text = State.boot_mode
         self.msg.text = State.msg
         self.prev_state = State.__dict__.copy()
+        return True
 
     def activate_repl_view(self):
         "set the display to render circuitpython's REPL view"
@@ -192,35 +271,38 @@ class Display(Module):
         # it doesn't crash, it just does nothing -\_(o_o)_/-
         # assinging it to self.driver.root_group works though
         self.driver.root_group = repl_view
+        # nothing calls refresh() any more once the keyboard has stopped
+        self.driver.auto_refresh = True
 
     # region Module methods
 
     def during_bootup(self, keyboard):
         displayio.release_displays()
         display_bus = I2CDisplay(board.I2C(), device_address=0x3C)
-        self.driver = SSD1306(display_bus, width=128, height=64)
+        # refreshed explicitly from _refresh(), so the redraw doesn't happen at some random point in the loop
+        self.driver = SSD1306(display_bus, width=128, height=64, auto_refresh=False)
         self.create_layout()
+        self.create_hud_layout()
         self.driver.root_group = self.root
-        self._task = create_task(self._update_layout, period_ms=(1000 // self.refresh_rate))
+        self._task = create_task(self._refresh, period_ms=(1000 // self.refresh_rate))
         return
 
     def before_matrix_scan(self, keyboard):
         return
 
+    @tracked('Display.after_matrix_scan')
     def after_matrix_scan(self, keyboard: "Ergo9000"):
         '''
         update all state variables based on the current keyboard state
         '''
         State.layer = keyboard.active_layers[0]
-        if KC.MEH in keyboard.keys_pressed:
-            State.ctrl = State.alt = State.shift = True
-        elif KC.HYPR in keyboard.keys_pressed:
-            State.ctrl = State.alt = State.shift = State.gui = True
-        else:
-            State.ctrl = bool(keyboard.keys_pressed.intersection({KC.LCTL, KC.RCTL}))
-            State.alt = bool(keyboard.keys_pressed.intersection({KC.LALT, KC.RALT}))
-            State.shift = bool(keyboard.keys_pressed.intersection({KC.LSFT, KC.RSFT}))
-            State.gui = bool(keyboard.keys_pressed.intersection({KC.LGUI, KC.RGUI}))
+        # the report filter already folded MEH / HYPR and friends into
+        # modifier bits when it built the last report, so just read those
+        report = keyboard.report_filter
+        State.ctrl = report.ctrl
+        State.alt = report.alt
+        State.shift = report.shift
+        State.gui = report.gui
         # boot mode does not change
         # msg does not change on keypress
         return
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+This tool rasterizes the parts of HackNerdFont-Regular.ttf that the OLED layout actually uses
+into small on-device assets, so the display never has to load the full 2.4MB TTF or a hand-made BMP.
+
+It outputs three files:
+- a BDF bitmap font with only the text codepoints (layer names, status messages, boot mode, etc),
+  rendered into a fixed cell sized to match the 6px-per-char math in display.py
+- a 1-bit BMP glyph sheet, one 12x12 tile per named icon (modifiers, OS, console)
+- glyphs.py, an index map from icon name to tile index, which display.py uses to look up glyphs by name
+
+Requires Pillow (host only, this file is never copied to the keyboard).
+"""
+import argparse
+import string
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Named icons and the Nerd Font codepoints they are rendered from.
+# Order here is the tile order in the generated glyph sheet.
+ICONS = {
+    'ctrl': 0xF0634,  # nf-md-apple_keyboard_control
+    'alt': 0xF0635,  # nf-md-apple_keyboard_option
+    'shift': 0xF0636,  # nf-md-apple_keyboard_shift
+    'gui': 0xF0633,  # nf-md-apple_keyboard_command
+    'win': 0xF17A,  # nf-fa-windows
+    'mac': 0xF179,  # nf-fa-apple
+    'con': 0xF120,  # nf-fa-terminal
+}
+
+# State.msg can hold arbitrary status text, so the text subset is printable ASCII
+# rather than only the handful of strings the layout hard-codes.
+TEXT = string.ascii_letters + string.digits + string.punctuation + ' '
+
+
+def fit_font(ttf: Path, cell_width: int, cell_height: int) -> ImageFont.FreeTypeFont:
+    "Find the largest point size whose advance and line height fit inside the cell"
+    for size in range(cell_height * 2, 0, -1):
+        font = ImageFont.truetype(str(ttf), size)
+        ascent, descent = font.getmetrics()
+        if font.getlength('M') <= cell_width and ascent + descent <= cell_height:
+            return font
+    raise ValueError(f'No size of {ttf} fits a {cell_width}x{cell_height} cell')
+
+
+def render_cell(font: ImageFont.FreeTypeFont, char: str, width: int, height: int) -> Image.Image:
+    "Render a single character into a 1-bit cell, centered horizontally, on the font's baseline"
+    ascent, descent = font.getmetrics()
+    left, top, right, bottom = font.getbbox(char)
+    x = (width - (right - left)) // 2 - left
+    y = (height - (ascent + descent)) // 2
+    image = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(image).text((x, y), char, font=font, fill=255)
+    return image.point(lambda p: 1 if p >= 128 else 0, mode='1')
+
+
+def write_bdf(path: Path, font: ImageFont.FreeTypeFont, chars: str, width: int, height: int):
+    "Write a fixed-cell BDF font containing only the given characters"
+    ascent, descent = font.getmetrics()
+    # keep the baseline where render_cell put it
+    baseline = (height - (ascent + descent)) // 2 + ascent
+    row_bytes = (width + 7) // 8
+    glyphs = []
+    for char in sorted(set(chars)):
+        cell = render_cell(font, char, width, height)
+        rows = []
+        for y in range(height):
+            bits = 0
+            for x in range(width):
+                if cell.getpixel((x, y)):
+                    bits |= 1 << (row_bytes * 8 - 1 - x)
+            rows.append(f'{bits:0{row_bytes * 2}X}')
+        glyphs.append((char, rows))
+
+    with path.open('w') as f:
+        f.write('STARTFONT 2.1\n')
+        f.write(f'FONT -ergo9000-hack-medium-r-normal--{height}-{height * 10}-75-75-c-{width * 10}-iso10646-1\n')
+        f.write(f'SIZE {height} 75 75\n')
+        f.write(f'FONTBOUNDINGBOX {width} {height} 0 {baseline - height}\n')
+        f.write('STARTPROPERTIES 2\n')
+        f.write(f'FONT_ASCENT {baseline}\n')
+        f.write(f'FONT_DESCENT {height - baseline}\n')
+        f.write('ENDPROPERTIES\n')
+        f.write(f'CHARS {len(glyphs)}\n')
+        for char, rows in glyphs:
+            f.write(f'STARTCHAR U+{ord(char):04X}\n')
+            f.write(f'ENCODING {ord(char)}\n')
+            f.write(f'SWIDTH {width * 1000 // height} 0\n')
+            f.write(f'DWIDTH {width} 0\n')
+            f.write(f'BBX {width} {height} 0 {baseline - height}\n')
+            f.write('BITMAP\n')
+            for row in rows:
+                f.write(f'{row}\n')
+            f.write('ENDCHAR\n')
+        f.write('ENDFONT\n')
+
+
+def write_sheet(path: Path, font: ImageFont.FreeTypeFont, icons: dict[str, int], tile: int):
+    "Write a horizontal 1-bit BMP strip with one tile per icon, in dict order"
+    sheet = Image.new('1', (tile * len(icons), tile), 0)
+    for index, codepoint in enumerate(icons.values()):
+        sheet.paste(render_cell(font, chr(codepoint), tile, tile), (index * tile, 0))
+    sheet.save(path, format='BMP')
+
+
+def write_index(path: Path, icons: dict[str, int], sheet: str, font: str, tile: int):
+    "Write the name -> tile index map that display.py imports"
+    lines = [
+        '# generated by font_subset.py, do not edit by hand',
+        f'SHEET = {sheet!r}',
+        f'FONT = {font!r}',
+        f'TILE = {tile}',
+        'INDEX = {',
+    ]
+    lines += [f'    {name!r}: {index},' for index, name in enumerate(icons)]
+    lines += ['}', '']
+    path.write_text('\n'.join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ttf', type=Path, default=Path('HackNerdFont-Regular.ttf'))
+    parser.add_argument('--text', default=TEXT, help='characters to include in the text font')
+    parser.add_argument('--cell-width', type=int, default=6, help='text cell width, display.py assumes 6')
+    parser.add_argument('--cell-height', type=int, default=12, help='text cell height')
+    parser.add_argument('--tile', type=int, default=12, help='icon tile size, Glyphs assumes 12')
+    parser.add_argument('--font-out', type=Path, default=Path('font.bdf'))
+    parser.add_argument('--sheet-out', type=Path, default=Path('glyphs.bmp'))
+    parser.add_argument('--index-out', type=Path, default=Path('glyphs.py'))
+    args = parser.parse_args()
+
+    text_font = fit_font(args.ttf, args.cell_width, args.cell_height)
+    write_bdf(args.font_out, text_font, args.text, args.cell_width, args.cell_height)
+
+    icon_font = ImageFont.truetype(str(args.ttf), args.tile)
+    write_sheet(args.sheet_out, icon_font, ICONS, args.tile)
+
+    write_index(args.index_out, ICONS, args.sheet_out.name, args.font_out.name, args.tile)
+    print(f'Wrote {args.font_out} ({len(set(args.text))} chars), {args.sheet_out} ({len(ICONS)} icons), {args.index_out}')
+
+
+if __name__ == '__main__':
+    main()
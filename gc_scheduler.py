@@ -0,0 +1,157 @@
+import gc
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+from kmk.utils import Debug
+
+import settings
+
+debug = Debug(__name__)
+
+# Allocation tracking costs two gc.mem_alloc() calls per tracked call, so it is only
+# switched on in USB write / debug mode
+TRACKING = settings.load().boot_mode == settings.BOOT_USB_WRITE
+
+# name -> [calls, total bytes, worst bytes]
+ALLOCS = {}
+
+
+def tracked(name):
+    "Decorator which records how much each call to the wrapped function allocates"
+
+    def decorator(fn):
+        if not TRACKING:
+            return fn
+        stats = ALLOCS[name] = [0, 0, 0]
+
+        def wrapper(*args, **kwargs):
+            start = gc.mem_alloc()
+            result = fn(*args, **kwargs)
+            used = gc.mem_alloc() - start
+            stats[0] += 1
+            stats[1] += used
+            if used > stats[2]:
+                stats[2] = used
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class GCScheduler(Module):
+    '''
+    Run the garbage collector while the keyboard is idle, so GC pauses don't land inside a key event.
+
+    Held keys are counted from key events, so this has to come before any module that holds keys back
+    (combos, tap-hold) in the modules list, where it sees every physical press and release exactly once.
+    '''
+
+    def __init__(
+        self,
+        idle_ms: int = 50,
+        min_alloc: int = 4096,
+        max_loop_ms: int = 5,
+        report_ms: int = 10000,
+    ):
+        # how long after the last key event before we consider the keyboard idle
+        self.idle_ms = idle_ms
+        # don't bother collecting until at least this many bytes were allocated since the last collection
+        self.min_alloc = min_alloc
+        # skip collection if the loop iteration we just finished was already slow
+        self.max_loop_ms = max_loop_ms
+        self.report_ms = report_ms
+
+        self._last_activity = 0
+        # physical keys currently down. keys_pressed misses keys that act through their own handlers
+        # (layer keys, mouse keys) and keys held back by combos or tap-hold, so count events instead
+        self._held = 0
+        self._loop_start = 0
+        self._loop_alloc = 0
+        self._last_report = 0
+        self._baseline = 0
+
+        # stats
+        self.collections = 0
+        self.last_collect_ms = 0
+        self.worst_collect_ms = 0
+        self.worst_loop_alloc = 0
+
+    def _collect(self, now):
+        gc.collect()
+        elapsed = ticks_diff(ticks_ms(), now)
+        self.collections += 1
+        self.last_collect_ms = elapsed
+        if elapsed > self.worst_collect_ms:
+            self.worst_collect_ms = elapsed
+        self._baseline = gc.mem_alloc()
+        if debug.enabled:
+            debug('collected in ', elapsed, 'ms, ', gc.mem_free(), ' bytes free')
+
+    def _report(self):
+        debug(
+            'collections=', self.collections,
+            ' worst_collect_ms=', self.worst_collect_ms,
+            ' worst_loop_alloc=', self.worst_loop_alloc,
+        )
+        for name, (calls, total, worst) in ALLOCS.items():
+            if total:
+                debug(name, ': calls=', calls, ' total=', total, ' worst=', worst)
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        gc.collect()
+        self._baseline = gc.mem_alloc()
+        self._last_activity = self._last_report = ticks_ms()
+
+    def before_matrix_scan(self, keyboard):
+        self._loop_start = ticks_ms()
+        if TRACKING:
+            self._loop_alloc = gc.mem_alloc()
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        self._last_activity = ticks_ms()
+        if is_pressed:
+            self._held += 1
+        elif self._held:
+            self._held -= 1
+        return key
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        if TRACKING:
+            used = gc.mem_alloc() - self._loop_alloc
+            if used > self.worst_loop_alloc:
+                self.worst_loop_alloc = used
+
+        now = ticks_ms()
+        if (
+            not self._held
+            and not keyboard.keys_pressed
+            and ticks_diff(now, self._last_activity) >= self.idle_ms
+            and ticks_diff(now, self._loop_start) <= self.max_loop_ms
+            and gc.mem_alloc() - self._baseline >= self.min_alloc
+        ):
+            self._collect(now)
+
+        if debug.enabled and ticks_diff(now, self._last_report) >= self.report_ms:
+            self._last_report = now
+            self._report()
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
@@ -0,0 +1,14 @@
+# index for the hand-made glyphs-i.bmp sheet
+# run font_subset.py to regenerate this file, the sheet, and the text font from HackNerdFont-Regular.ttf
+SHEET = 'glyphs-i.bmp'
+FONT = None
+TILE = 12
+INDEX = {
+    'ctrl': 0,
+    'alt': 1,
+    'shift': 2,
+    'gui': 3,
+    'win': 4,
+    'mac': 5,
+    'con': 6,
+}
@@ -0,0 +1,124 @@
+import time
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+from kmk.utils import Debug
+
+debug = Debug(__name__)
+
+ACTIVE = 0
+IDLE = 1
+SLEEP = 2
+MODE_NAMES = ('active', 'idle', 'sleep')
+
+
+class LoopGovernor(Module):
+    '''
+    Run the main loop flat out while typing, and back off when the keyboard is idle.
+
+    This does not change the matrix scan rate: keypad scans the matrix in the background at a fixed
+    interval (1ms) in every mode. What changes is how often the main loop picks up its events.
+
+    In ACTIVE mode the main loop runs flat out. Once no key has been held for `idle_after_ms`, it
+    drops to IDLE, where the main loop sleeps `idle_sleep_ms` per iteration. SLEEP is the same with
+    a longer sleep, and is entered / left through the powersave hooks.
+    Any key event goes straight back to ACTIVE.
+
+    Because the scanning itself never stops, no edge is missed while the loop sleeps, and waking up
+    costs nothing on the key that wakes it.
+    '''
+
+    def __init__(
+        self,
+        idle_after_ms: int = 1000,
+        idle_sleep_ms: int = 5,
+        sleep_sleep_ms: int = 20,
+        report_ms: int = 10000,
+    ):
+        self.idle_after_ms = idle_after_ms
+        self.sleeps = (0, idle_sleep_ms / 1000, sleep_sleep_ms / 1000)
+        self.report_ms = report_ms
+
+        self.mode = ACTIVE
+        # keys held according to key events, which unlike keys_pressed also
+        # counts keys that act through their own handlers, like mouse keys
+        self._held = 0
+        self._last_activity = 0
+        self._mode_start = 0
+        self._last_report = 0
+
+        # per mode stats: main loop iterations and total ms spent in the mode
+        self.loops = [0, 0, 0]
+        self.mode_ms = [0, 0, 0]
+
+    def _set_mode(self, mode):
+        if mode == self.mode:
+            return
+        now = ticks_ms()
+        self.mode_ms[self.mode] += ticks_diff(now, self._mode_start)
+        self._mode_start = now
+        self.mode = mode
+
+    def loop_rate(self, mode):
+        "Average main loop iterations per second spent in `mode`"
+        ms = self.mode_ms[mode]
+        if mode == self.mode:
+            ms += ticks_diff(ticks_ms(), self._mode_start)
+        return self.loops[mode] * 1000 // ms if ms else 0
+
+    def _report(self):
+        for mode, name in enumerate(MODE_NAMES):
+            debug(name, ': ', self.loop_rate(mode), ' loops/s, ', self.mode_ms[mode], 'ms')
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        self._last_activity = self._mode_start = self._last_report = ticks_ms()
+
+    def before_matrix_scan(self, keyboard):
+        self.loops[self.mode] += 1
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        self._last_activity = ticks_ms()
+        if is_pressed:
+            self._held += 1
+        elif self._held:
+            self._held -= 1
+        if self.mode != ACTIVE:
+            self._set_mode(ACTIVE)
+        return key
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        now = ticks_ms()
+        if self._held or keyboard.keys_pressed:
+            self._last_activity = now
+        elif self.mode == ACTIVE and ticks_diff(now, self._last_activity) >= self.idle_after_ms:
+            self._set_mode(IDLE)
+
+        if debug.enabled and ticks_diff(now, self._last_report) >= self.report_ms:
+            self._last_report = now
+            self._report()
+
+        if self.mode != ACTIVE:
+            # keypad keeps scanning in the background and queues events while we sleep,
+            # so the worst case cost is one sleep of extra latency on the first key after idling
+            time.sleep(self.sleeps[self.mode])
+
+    def on_powersave_enable(self, keyboard):
+        self._set_mode(SLEEP)
+
+    def on_powersave_disable(self, keyboard):
+        self._last_activity = ticks_ms()
+        self._set_mode(ACTIVE)
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
@@ -0,0 +1,104 @@
+from kmk.keys import ConsumerKey, KeyboardKey, ModifiedKey, ModifierKey, MouseKey
+from kmk.utils import Debug
+
+debug = Debug(__name__)
+
+# Fingerprint layout:
+#   0       modifier bits
+#   1..32   one bit per keyboard keycode (0-255)
+#   33      mouse button bits
+#   34..35  consumer control code
+MODS = 0
+KEYS = 1
+BUTTONS = 33
+CONSUMER = 34
+SIZE = 36
+
+_CTRL = 0x11
+_SHIFT = 0x22
+_ALT = 0x44
+_GUI = 0x88
+
+# log the sent / suppressed counts once per this many reports
+LOG_EVERY = 1000
+
+
+class ReportFilter:
+    '''
+    Builds a fixed-size bitmap fingerprint of everything that goes into the HID reports,
+    and tells the keyboard when it is identical to the last one sent, so the USB write can be skipped.
+
+    Because it is a bitmap rather than a 6 slot array, it works the same with the NKRO report
+    enabled in boot.py.
+    '''
+
+    def __init__(self):
+        self._report = bytearray(SIZE)
+        self._last = bytearray(SIZE)
+        self._zero = bytes(SIZE)
+        self.sent = 0
+        self.suppressed = 0
+
+    @property
+    def mods(self):
+        "Modifier bits of the last report, with MEH / HYPR already fanned out into their modifiers"
+        return self._last[MODS]
+
+    @property
+    def ctrl(self):
+        return bool(self._last[MODS] & _CTRL)
+
+    @property
+    def shift(self):
+        return bool(self._last[MODS] & _SHIFT)
+
+    @property
+    def alt(self):
+        return bool(self._last[MODS] & _ALT)
+
+    @property
+    def gui(self):
+        return bool(self._last[MODS] & _GUI)
+
+    def _build(self, keys_pressed):
+        "Fill in the fingerprint, returns False if a key can't be represented in it"
+        report = self._report
+        report[:] = self._zero
+        for key in keys_pressed:
+            if isinstance(key, ModifiedKey):
+                report[MODS] |= key.modifier.code
+                key = key.key
+            if isinstance(key, ModifierKey):
+                report[MODS] |= key.code
+            elif isinstance(key, KeyboardKey):
+                report[KEYS + (key.code >> 3)] |= 1 << (key.code & 0x07)
+            elif isinstance(key, MouseKey):
+                report[BUTTONS] |= key.code
+            elif isinstance(key, ConsumerKey):
+                report[CONSUMER] = key.code & 0xFF
+                report[CONSUMER + 1] = key.code >> 8
+            else:
+                return False
+        return True
+
+    def should_send(self, keys_pressed, axes):
+        "Returns False when the report would be identical to the last one sent"
+        # pointer motion is relative, so a report with motion is never a duplicate
+        if self._build(keys_pressed) and not axes and self._report == self._last:
+            self.suppressed += 1
+            send = False
+        else:
+            self._last[:] = self._report
+            self.sent += 1
+            send = True
+        if debug.enabled and not (self.sent + self.suppressed) % LOG_EVERY:
+            self.log()
+        return send
+
+    def log(self):
+        "Print how many reports were sent and how many were skipped as duplicates"
+        total = self.sent + self.suppressed
+        debug(
+            'reports: ', self.sent, ' sent, ', self.suppressed, ' suppressed (',
+            self.suppressed * 100 // total if total else 0, '%)'
+        )
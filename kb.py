@@ -3,8 +3,20 @@ from storage import getmount
 import microcontroller
 import time
 
+from combos import Combos
+import debounce
+from debounce import EagerMatrixScanner
 from display import Display, State
-from keymap import get_keymap
+from gc_scheduler import GCScheduler, tracked
+from governor import LoopGovernor
+from hid_filter import ReportFilter
+import keymap
+from macros import Macros
+from mouse_motion import MouseMotion
+from perf import PerfMonitor
+from split_link import SplitLink
+from taphold import TapHold
+import settings
 
 from kmk.kmk_keyboard import KMKKeyboard
 from kmk.keys import KC, Key, make_key
@@ -13,7 +25,6 @@ from kmk.modules import Module
 from kmk.modules.layers import Layers
 from kmk.modules.split import Split, SplitSide
 from kmk.modules.serialace import SerialACE
-from kmk.modules.mouse_keys import MouseKeys
 from kmk.extensions import Extension
 from kmk.extensions.media_keys import MediaKeys
 from kmk.scheduler import create_task
@@ -47,6 +58,15 @@ class Ergo9000(KMKKeyboard):
         board.D7,
     )
     diode_orientation = DiodeOrientation.COLUMNS
+    # eager debounce window in ms, and per-key overrides keyed by keymap position (the index into
+    # coord_mapping, like combos use), eg. a switch that has started to chatter can be given a longer window
+    debounce_ms = 5
+    debounce_windows: dict[int, int] = {}
+    # keys which type text through the macro engine, name -> items (strings and macros.Chord shortcuts)
+    # eg. {'SIG': ('Cheers,\n', 'Alex')} makes KC.SIG available to the keymap
+    snippets: dict[str, tuple] = {}
+    # default tapping term for KC.TH tap-hold keys, in ms. Keys can override it, eg. KC.TH(KC.A, KC.LCTL, tapping_term=250)
+    tapping_term = 200
 
     coord_mapping = [
         # fmt: off
@@ -63,27 +83,66 @@ class Ergo9000(KMKKeyboard):
     split = Split(
         split_side=split_side, data_pin=board.D2, data_pin2=board.D3, use_pio=True
     )
-    modules: list[Module] = [split, Layers({(1, 2): 3}), MouseKeys()]
+    split_link = SplitLink(split)
+    perf = PerfMonitor()
+    governor = LoopGovernor()
+    # the GC scheduler goes before anything that holds keys back (combos, tap-hold), so it sees every physical key event
+    gc_scheduler = GCScheduler()
+    modules: list[Module] = [split, split_link, gc_scheduler, Layers({(1, 2): 3}), MouseMotion(), perf, governor]
     extensions: list[Extension] = [MediaKeys()]
 
     def __init__(self) -> None:
-        if microcontroller.nvm[0] == 1:  # type: ignore
+        self.settings = settings.load()
+        if self.settings.boot_mode == settings.BOOT_USB_WRITE:
             # We are in USB write / debug mode
             self.modules.append(SerialACE())
             self.debug_enabled = True
-        self.mac_mode = True
+        if self.settings.flags & settings.FLAG_DEBUG:
+            self.debug_enabled = True
+        self.matrix = EagerMatrixScanner(
+            self.col_pins,
+            self.row_pins,
+            columns_to_anodes=self.diode_orientation,
+            window_ms=self.debounce_ms,
+            # the scanner works in coords, so translate the positions once, here
+            windows={self.coord_mapping[position]: ms for position, ms in self.debounce_windows.items()},
+        )
         if split_side == SplitSide.LEFT:
-            self.display = Display(self)
+            self.display = Display(self, refresh_rate=self.settings.refresh_rate or 10)
             self.modules.append(self.display)
 
+        self.report_filter = ReportFilter()
+        self.macros = Macros()
+        self.modules.append(self.macros)
+        for name, items in self.snippets.items():
+            self.macros.snippet((name,), *items)
+
         make_key(names=('BOOT',), on_press=self.boot_handler)
         make_key(names=('OS',), on_press=self.os_switch_handler)
+        make_key(names=('NKRO',), on_press=self.nkro_handler)
+        make_key(names=('HUD',), on_press=self.hud_handler)
         make_key(names=('COPY',), on_press=self.handle_copy, on_release=self.handle_copy_release)
         make_key(names=('CUT',), on_press=self.handle_cut, on_release=self.handle_cut_release)
         make_key(names=('PASTE',), on_press=self.handle_paste, on_release=self.handle_paste_release)
 
-        self.keymap = get_keymap()
+        # KC.TH has to exist before the keymap is built
+        self.taphold = TapHold(tapping_term=self.tapping_term)
+        self.keymap = keymap.get_keymap()
+        # combos hold back keys before anything else sees them, so they go right after the split modules and GC,
+        # followed by tap-hold, so keys with a tap-hold legend can still be part of a combo
+        # keymaps generated before combos were supported have no get_combos()
+        self.combos = Combos(getattr(keymap, 'get_combos', list)())
+        self.modules.insert(self.modules.index(self.gc_scheduler) + 1, self.combos)
+        self.modules.insert(self.modules.index(self.combos) + 1, self.taphold)
+
+    @property
+    def mac_mode(self) -> bool:
+        return self.settings.mac_mode
 
+    @mac_mode.setter
+    def mac_mode(self, value: bool):
+        self.settings.mac_mode = value
+        self.settings.flush_later()
 
     def boot_handler(self, key, keyboard: 'Ergo9000', *args):
         layers = keyboard.active_layers
@@ -93,18 +152,36 @@ class Ergo9000(KMKKeyboard):
             print("Booting to BOOTLOADER...")
             microcontroller.on_next_reset(microcontroller.RunMode.BOOTLOADER)
         else:
-            if microcontroller.nvm[0] == 0:  # type: ignore
+            if keyboard.settings.boot_mode == settings.BOOT_NORMAL:
                 print("Booting to USB Write Mode...")
-                microcontroller.nvm[0] = 1  # type: ignore
+                keyboard.settings.boot_mode = settings.BOOT_USB_WRITE
             else:
                 print("Booting to NORMAL mode...")
-                microcontroller.nvm[0] = 0  # type: ignore
+                keyboard.settings.boot_mode = settings.BOOT_NORMAL
+            keyboard.settings.flush()
         create_task(lambda: microcontroller.reset(), after_ms=200)  # type: ignore
 
     def os_switch_handler(self, key, keyboard: 'Ergo9000', *args):
         keyboard.mac_mode = not keyboard.mac_mode
         return keyboard
 
+    def hud_handler(self, key, keyboard: 'Ergo9000', *args):
+        # only the left half has a display
+        if keyboard.display:
+            keyboard.display.toggle_hud()
+        return keyboard
+
+    def nkro_handler(self, key, keyboard: 'Ergo9000', *args):
+        # the report descriptor is fixed in boot.py, so this only takes effect after a reset
+        keyboard.settings.flags ^= settings.FLAG_NKRO
+        keyboard.settings.flush_later()
+        if keyboard.settings.flags & settings.FLAG_NKRO:
+            State.msg = "NKRO on reset"
+        else:
+            State.msg = "6KRO on reset"
+        return keyboard
+
+    @tracked('copy')
     def handle_copy(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -115,6 +192,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.add(KC.C)
         return keyboard
     
+    @tracked('copy_release')
     def handle_copy_release(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -125,6 +203,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.remove(KC.C)
         return keyboard
 
+    @tracked('cut')
     def handle_cut(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -135,6 +214,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.add(KC.X)
         return keyboard
     
+    @tracked('cut_release')
     def handle_cut_release(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -145,6 +225,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.remove(KC.X)
         return keyboard
 
+    @tracked('paste')
     def handle_paste(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -155,6 +236,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.add(KC.V)
         return keyboard
     
+    @tracked('paste_release')
     def handle_paste_release(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -165,6 +247,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.remove(KC.V)
         return keyboard
 
+    @tracked('undo')
     def handle_undo(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -175,6 +258,7 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.add(KC.Z)
         return keyboard
     
+    @tracked('undo_release')
     def handle_undo_release(self, key, keyboard: 'Ergo9000', *args):
         keyboard.hid_pending = True
         if self.mac_mode:
@@ -185,7 +269,15 @@ class Ergo9000(KMKKeyboard):
             keyboard.keys_pressed.remove(KC.Z)
         return keyboard
 
+    def _send_hid(self) -> None:
+        # skip the USB write entirely when the report hasn't changed since the last one
+        if not self.report_filter.should_send(self.keys_pressed, self.axes):
+            self.hid_pending = False
+            return
+        super()._send_hid()
+
     def go(self, *args, **kwargs) -> None:
+            debounce.active = self.matrix
             try:
                 self._init(*args, **kwargs)
                 while True:
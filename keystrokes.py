@@ -0,0 +1,97 @@
+'''
+Turning text and shortcuts into HID report states, with no device dependencies,
+so it can be run (and its throughput measured) on the host as well as the keyboard.
+'''
+
+# 6KRO: the boot keyboard report has room for 6 keys besides the modifiers
+MAX_KEYS = 6
+
+# US layout: character -> (KC name, needs shift)
+CHARS = {' ': ('SPC', False), '\n': ('ENTER', False), '\t': ('TAB', False)}
+for _c in 'abcdefghijklmnopqrstuvwxyz':
+    CHARS[_c] = (_c.upper(), False)
+    CHARS[_c.upper()] = (_c.upper(), True)
+for _plain, _shifted, _name in (
+    ('1', '!', 'N1'), ('2', '@', 'N2'), ('3', '#', 'N3'), ('4', '$', 'N4'), ('5', '%', 'N5'),
+    ('6', '^', 'N6'), ('7', '&', 'N7'), ('8', '*', 'N8'), ('9', '(', 'N9'), ('0', ')', 'N0'),
+    ('-', '_', 'MINS'), ('=', '+', 'EQL'), ('[', '{', 'LBRC'), (']', '}', 'RBRC'),
+    ('\\', '|', 'BSLS'), (';', ':', 'SCLN'), ("'", '"', 'QUOT'), (',', '<', 'COMM'),
+    ('.', '>', 'DOT'), ('/', '?', 'SLSH'), ('`', '~', 'GRV'),
+):
+    CHARS[_plain] = (_name, False)
+    CHARS[_shifted] = (_name, True)
+
+_NO_MODS = ()
+_SHIFT = ('LSFT',)
+_RELEASE = (_NO_MODS, ())
+
+
+class Chord:
+    "An OS-aware shortcut: Chord('C') is cmd+c in mac mode and ctrl+c otherwise"
+
+    def __init__(self, key: str, shift: bool = False):
+        self.key = key
+        self.shift = shift
+
+
+COPY = Chord('C')
+CUT = Chord('X')
+PASTE = Chord('V')
+UNDO = Chord('Z')
+REDO = Chord('Z', shift=True)
+
+
+def reports(items, mac_mode: bool):
+    '''
+    Yield the sequence of (modifier names, key names) reports that types `items`.
+
+    `items` is any mix of strings and Chords. Keys already down stay down while new ones are
+    added one per report (so the host sees the presses in order), and a release report is only
+    sent when a character repeats, the shift state changes, or all 6 key slots are in use.
+    '''
+    held = []
+    held_mods = _NO_MODS
+    for item in items:
+        if isinstance(item, Chord):
+            if held:
+                held = []
+                yield _RELEASE
+            mods = ('LGUI',) if mac_mode else ('LCTL',)
+            if item.shift:
+                mods += _SHIFT
+            yield (mods, (item.key,))
+            yield _RELEASE
+            held_mods = _NO_MODS
+            continue
+
+        for char in item:
+            name, shifted = CHARS[char]
+            mods = _SHIFT if shifted else _NO_MODS
+            if held and (mods != held_mods or name in held or len(held) == MAX_KEYS):
+                held = []
+                yield _RELEASE
+            held_mods = mods
+            held.append(name)
+            yield (mods, tuple(held))
+    if held:
+        yield _RELEASE
+
+
+def unmappable(items):
+    "Return the characters in `items` that have no key on the US layout, in order of appearance"
+    missing = []
+    for item in items:
+        if isinstance(item, Chord):
+            continue
+        for char in item:
+            if char not in CHARS and char not in missing:
+                missing.append(char)
+    return missing
+
+
+def mappable(items):
+    "Return `items` with any character that has no key on the US layout dropped"
+    return tuple(
+        item if isinstance(item, Chord) else ''.join(char for char in item if char in CHARS)
+        for item in items
+    )
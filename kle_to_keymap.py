@@ -1,71 +1,135 @@
 #!/usr/bin/env python3
 """
-This tool takes in a http://www.keyboard-layout-editor.com/ JSON file and outputs a keymap.py file.
+This tool takes in http://www.keyboard-layout-editor.com/ JSON files and outputs keymap.py files.
 Legends on corners are used to indicate layers, and legends on keys are used to indicate keycodes.
-This current implementation is designed for QMK-style "TRI-LAYER" keymaps (aka combo layers), 
-where the layer names are assumed to be "base", "lower", "raise", and "adjust".
+
+By default it renders the BFO-9000 gist into keymap.py, using a QMK-style "TRI-LAYER" scheme
+(aka combo layers), where the layer names are "base", "lower", "raise", and "adjust".
 for each key in KLE:
-the bottom-left legend is mapped to the "base" layer,
-the bottom-right legend is mapped to the "lower" layer,
-the top-left legend is mapped to the "raise" layer, 
-the top-right legend is mapped to the "adjust" layer,
+the center legend is mapped to the "base" layer,
+the bottom-left legend is mapped to the "lower" layer,
+the top-right legend is mapped to the "raise" layer,
+the top-left legend is mapped to the "adjust" layer,
+
+Any other layer scheme (more layers, different legend positions) can be given with --layers,
+and any number of board variants can be generated at once from a JSON config file:
+
+    [
+        {"source": "gist:243f9603668444a00b277037db219554/BFO-9000.kbd.json", "output": "keymap.py"},
+        {"source": "variants/numpad.kbd.json", "output": "keymap_numpad.py",
+         "layers": {"base": 4, "lower": 6, "raise": 2, "adjust": 0, "mouse": 8}}
+    ]
+
+Variants are generated in parallel, one process each, so regenerating all of them takes about
+as long as the slowest one. It can also be used as a library, see generate().
+
+Combos (see combos.py) are declared on the front face legend (index 11) with whitespace separated tokens:
+every key in a combo gets "combo:<name>", and exactly one of them declares the result as
+"combo:<name>=<legend>", eg. "combo:jk=Esc" on J and "combo:jk" on K types Esc when both are pressed.
+
+Tap-hold keys (see taphold.py) use a "<tap>/<hold>" legend, with an optional tapping term in ms,
+eg. "Space/Lower" or "A/Ctrl@250". A lone "/" is still the slash key.
 """
+import argparse
 import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from textwrap import dedent
 import sys
 import subprocess
-import pprint
 
-import requests
+DEFAULT_SOURCE = 'gist:243f9603668444a00b277037db219554/BFO-9000.kbd.json'
+DEFAULT_OUTPUT = 'keymap.py'
+
+# maps layer names to the legend index from which they pull their keys
+# legends are indexed as follows:
+# +-----------+
+# | 0 | 1 | 2 | Top row
+# | 3 | 4 | 5 | Middle row
+# | 6 | 7 | 8 | Bottom row
+# | 9 |10 |11 | Front face
+# +-----------+
+DEFAULT_LAYERS = {
+    'base': 4, # center legend
+    'lower': 6, # bottom-left legend
+    'raise': 2, # top-right legend
+    'adjust': 0, # top-left legend
+}
+
+# the front face legend carries extra info about a key, like 'numpad' or combo declarations
+EXTRA_INFO = 11
+
+# keys which get_keymap() defines as local shortcuts, and what they expand to
+SHORTCUTS = {
+    "WSP_NXT": "KC.HYPR(KC.RIGHT)",
+    "WSP_PRV": "KC.HYPR(KC.LEFT)",
+    "MSN_CTL": "KC.HYPR(KC.UP)",
+    "DSP_NXT": "KC.MEH(KC.RIGHT)",
+    "DSP_PRV": "KC.MEH(KC.LEFT)",
+}
+
+tmpdir = Path('/tmp/kle_to_keymap')
+
+
+def github_token():
+    return subprocess.run('pass show github-gist-token'.split(), capture_output=True, text=True).stdout.strip()
+
 
-token = subprocess.run('pass show github-gist-token'.split(), capture_output=True, text=True).stdout.strip()
+def get_gist(gist_id, token):
+    import requests
 
-def get_gist(gist_id):
     url = f'https://api.github.com/gists/{gist_id}'
     r = requests.get(url, headers={'Authorization': f'token {token}'})
     r.raise_for_status()
     return r.json()
 
-kle_data = get_gist('243f9603668444a00b277037db219554')['files']['BFO-9000.kbd.json']['content']
 
+def read_source(source: str, token: str | None = None) -> str:
+    "Read KLE JSON from either a local path or 'gist:<gist id>/<file name>'"
+    if source.startswith('gist:'):
+        gist_id, filename = source.removeprefix('gist:').split('/', 1)
+        return get_gist(gist_id, token)['files'][filename]['content']
+    return Path(source).read_text()
 
-def calculate_row_width():
+
+def calculate_row_width(kle_data: str) -> int:
     for row in json.loads(kle_data):
         if not isinstance(row, list):
             continue
         return len([key for key in row if isinstance(key, str)])
     raise ValueError('Could not determine row width')
 
-row_width = calculate_row_width()
 
-tmpdir = Path('/tmp/kle_to_keymap')
-tmpdir.mkdir(exist_ok=True)
-tmpdir.joinpath('package.json').write_text(dedent("""
-    {
-    "name": "kle-parser",
-    "version": "1.0.0",
-    "main": "index.js",
-    "scripts": {
-        "index.js": "node index.js"
-    },
-    "dependencies": {
-        "@ijprest/kle-serial": "^0.15.1"
-    }
-    }
-    """))
-tmpdir.joinpath('index.js').write_text(dedent("""
-    var kle = require("@ijprest/kle-serial");
-    var fs = require('fs');
-    var data = fs.readFileSync(0, 'utf-8');
-    var keyboard = kle.Serial.parse(data);
-
-    console.log(JSON.stringify(keyboard.keys));
-    """))
-
-try:
+def setup_parser():
+    "Install the node KLE parser, this only needs to happen once, before any variants are generated"
+    tmpdir.mkdir(exist_ok=True)
+    tmpdir.joinpath('package.json').write_text(dedent("""
+        {
+        "name": "kle-parser",
+        "version": "1.0.0",
+        "main": "index.js",
+        "scripts": {
+            "index.js": "node index.js"
+        },
+        "dependencies": {
+            "@ijprest/kle-serial": "^0.15.1"
+        }
+        }
+        """))
+    tmpdir.joinpath('index.js').write_text(dedent("""
+        var kle = require("@ijprest/kle-serial");
+        var fs = require('fs');
+        var data = fs.readFileSync(0, 'utf-8');
+        var keyboard = kle.Serial.parse(data);
+
+        console.log(JSON.stringify(keyboard.keys));
+        """))
     if not tmpdir.joinpath('node_modules').exists():
         subprocess.run(["npm", "install"], check=True, cwd=tmpdir)
+
+
+def parse_labels(kle_data: str):
+    "Run KLE JSON through kle-serial, yielding the 12 legends of each key, in order"
     normalized_json = subprocess.run(
         ["npm", "run", "index.js"],
         input=kle_data,
@@ -75,48 +139,15 @@ try:
         cwd=tmpdir,
     ).stdout
     normalized_json = normalized_json.splitlines()[-1]
-except subprocess.CalledProcessError as e:
-    print(e.stderr)
-    sys.exit(1)
-
-keys = json.loads(normalized_json)
-
-keys = (key['labels'] for key in keys)
-
-def normalize_labels(keys):
-    for key in keys:
+    for key in json.loads(normalized_json):
+        labels = key['labels']
         # pad each list of labels out to 12 elements
-        key.extend([''] * (12 - len(key)))
+        labels.extend([''] * (12 - len(labels)))
         # replace each None with an empty string
-        key = [x if x is not None else '' for x in key]
-        yield key
-
-keys = normalize_labels(keys)
-
-layer_map = {
-    # maps layer names to the legend index from which they pull their keys
-    # legends are indexed as follows:
-    # +-----------+
-    # | 0 | 1 | 2 | Top row
-    # | 3 | 4 | 5 | Middle row
-    # | 6 | 7 | 8 | Bottom row
-    # | 9 |10 |11 | Front face
-    # +-----------+
-    'base': 4, # center legend 
-    'lower': 6, # bottom-left legend
-    'raise': 2, # top-right legend
-    'adjust': 0, # bottom-right legend
-}
+        yield [x if x is not None else '' for x in labels]
 
-layers = {
-    "base": [],
-    "lower": [],
-    "raise": [],
-    "adjust": [],
-}
-        
 
-def map_key(lkey, layer, index, extra_info):
+def map_key(lkey, layer, index, extra_info, row_width, layer_names):
     """Map each key string from KLE into a valid KC keycode"""
     _row_offset = index % row_width
     if _row_offset <= (row_width / 2):
@@ -125,16 +156,18 @@ def map_key(lkey, layer, index, extra_info):
     else:
         # right hand
         side = "R"
+    tap, _, hold = lkey.partition("/")
+    if tap and hold:
+        return map_tap_hold(tap, hold, layer, index, extra_info, row_width, layer_names)
     match lkey:
         case "":
-            if layer == 'base':
+            if layer == layer_names[0]:
                 return "NO"
             else:
                 return "TRNS"
-        case "Lower":
-            return "MO(1)"
-        case "Raise":
-            return "MO(2)"
+        case _ if lkey.lower() in layer_names[1:]:
+            # a legend naming one of the layers, eg. "Lower", momentarily activates that layer
+            return f"MO({layer_names.index(lkey.lower())})"
         case "Dbg":
             return "DEBUG"
         case "1" | "2" | "3" | "4" | "5" | "6" | "7" | "8" | "9" | "0":
@@ -318,47 +351,168 @@ def map_key(lkey, layer, index, extra_info):
             return lkey.upper()
 
 
-for index, labels in enumerate(keys):
-    for layer in layer_map:
-        key = labels[layer_map[layer]]
-        extra_info = labels[11]
-        key = map_key(key, layer, index, extra_info=extra_info)
-        layers[layer].append(key)
-
-# Now we render this data into a keymap.py file
-layers_s = "\n"
-for layer in layers:
-    layers_s += f"        [ # {layer}\n"
-    for index, key in enumerate(layers[layer]):
-        _row_offset = index % row_width
-        if _row_offset == 0:
-            layers_s += "             "
-        if _row_offset == (row_width / 2):
-            layers_s += "             "
-        if key == "TRNS":
-            layers_s += "___,       "
-        elif key in ["WSP_NXT", "WSP_PRV", "DSP_NXT", "DSP_PRV", "MSN_CTL"]:
-            layers_s += "{:11}".format(f"{key}, ")
-        else:
-            layers_s += "{:11}".format(f"KC.{key}, ")
-        if _row_offset == row_width-1:
-            layers_s += "\n"
-    layers_s += "        ],\n"
-keymap_s = f"""
-from kmk.keys import KC
-
-def get_keymap():
-    ___ = KC.TRNS
-    WSP_NXT = KC.HYPR(KC.RIGHT)
-    WSP_PRV = KC.HYPR(KC.LEFT)
-    MSN_CTL = KC.HYPR(KC.UP)
-    DSP_NXT = KC.MEH(KC.RIGHT)
-    DSP_PRV = KC.MEH(KC.LEFT)
-    return [
-        # fmt: off
-        {layers_s}
-        # fmt: on
-    ]
-"""
-Path('keymap.py').write_text(keymap_s)
-print("Done!")
+def map_tap_hold(tap, hold, layer, index, extra_info, row_width, layer_names):
+    "Map a '<tap>/<hold>[@ms]' legend into a TH keycode"
+    name, _, term = hold.rpartition("@")
+    if name and term.isdigit():
+        hold = name
+    else:
+        term = ""
+    tap_key = key_expression(map_key(tap, layer, index, extra_info, row_width, layer_names))
+    hold_key = key_expression(map_key(hold, layer, index, extra_info, row_width, layer_names))
+    if term:
+        return f"TH({tap_key}, {hold_key}, tapping_term={term})"
+    return f"TH({tap_key}, {hold_key})"
+
+
+def build_layers(labels, layer_map: dict[str, int], row_width: int) -> dict[str, list[str]]:
+    "Map every key's legends to a keycode on each layer"
+    layer_names = list(layer_map)
+    layers = {layer: [] for layer in layer_map}
+    for index, key_labels in enumerate(labels):
+        extra_info = key_labels[EXTRA_INFO]
+        for layer, legend in layer_map.items():
+            key = map_key(key_labels[legend], layer, index, extra_info, row_width, layer_names)
+            layers[layer].append(key)
+    return layers
+
+
+def build_combos(labels, layer_map: dict[str, int], row_width: int) -> dict[str, tuple[list[int], str]]:
+    "Collect the combos declared on front face legends, as name -> (keymap positions, result keycode)"
+    layer_names = list(layer_map)
+    positions = {}
+    results = {}
+    for index, key_labels in enumerate(labels):
+        for token in key_labels[EXTRA_INFO].split():
+            if not token.startswith('combo:'):
+                continue
+            name, _, legend = token.removeprefix('combo:').partition('=')
+            positions.setdefault(name, []).append(index)
+            if legend:
+                if name in results:
+                    raise ValueError(f'combo {name} declares its result more than once')
+                results[name] = map_key(legend, layer_names[0], index, '', row_width, layer_names)
+    combos = {}
+    for name, combo_positions in positions.items():
+        if name not in results:
+            raise ValueError(f'combo {name} has no result, add "combo:{name}=<legend>" to one of its keys')
+        if len(combo_positions) < 2:
+            raise ValueError(f'combo {name} only has one key')
+        combos[name] = (combo_positions, results[name])
+    return combos
+
+
+def key_expression(key: str) -> str:
+    "The python expression for a keycode returned by map_key"
+    return SHORTCUTS.get(key, f"KC.{key}")
+
+
+def write_keymap(f, layers: dict[str, list[str]], row_width: int, combos: dict[str, tuple[list[int], str]] | None = None):
+    "Render the layers as a keymap.py module, streaming it out to the open file `f` a row at a time"
+    f.write(dedent("""
+        from kmk.keys import KC
+
+        def get_keymap():
+            ___ = KC.TRNS
+            WSP_NXT = KC.HYPR(KC.RIGHT)
+            WSP_PRV = KC.HYPR(KC.LEFT)
+            MSN_CTL = KC.HYPR(KC.UP)
+            DSP_NXT = KC.MEH(KC.RIGHT)
+            DSP_PRV = KC.MEH(KC.LEFT)
+            return [
+                # fmt: off
+        """))
+    f.write("        \n")
+    for layer, keys in layers.items():
+        f.write(f"        [ # {layer}\n")
+        row = []
+        for index, key in enumerate(keys):
+            _row_offset = index % row_width
+            if _row_offset == 0:
+                row.append("             ")
+            if _row_offset == (row_width / 2):
+                row.append("             ")
+            if key == "TRNS":
+                row.append("___,       ")
+            elif key in SHORTCUTS:
+                row.append("{:11}".format(f"{key}, "))
+            else:
+                row.append("{:11}".format(f"KC.{key}, "))
+            if _row_offset == row_width-1:
+                row.append("\n")
+                f.write("".join(row))
+                row.clear()
+        f.write("".join(row))
+        f.write("        ],\n")
+    f.write("\n        # fmt: on\n    ]\n")
+    f.write("\n\ndef get_combos():\n    return [\n")
+    for name, (positions, result) in (combos or {}).items():
+        f.write(f"        ({tuple(positions)}, {key_expression(result)}),  # {name}\n")
+    f.write("    ]\n")
+
+
+def normalize_layers(layers: dict[str, int]) -> dict[str, int]:
+    "Layer names are matched against legends case-insensitively, so they are kept lowercase"
+    return {name.strip().lower(): legend for name, legend in layers.items()}
+
+
+def generate(source: str, output: str, layers: dict[str, int] | None = None, token: str | None = None) -> str:
+    "Generate a single keymap from a KLE source, returns the output path"
+    kle_data = read_source(source, token)
+    row_width = calculate_row_width(kle_data)
+    labels = list(parse_labels(kle_data))
+    layers = normalize_layers(layers or DEFAULT_LAYERS)
+    keymap_layers = build_layers(labels, layers, row_width)
+    combos = build_combos(labels, layers, row_width)
+    with open(output, 'w') as f:
+        write_keymap(f, keymap_layers, row_width, combos)
+    return output
+
+
+def _generate(variant: dict) -> str:
+    return generate(**variant)
+
+
+def parse_layers(spec: str) -> dict[str, int]:
+    "Parse a layer scheme like 'base=4,lower=6,raise=2,adjust=0'"
+    layers = {}
+    for item in spec.split(','):
+        name, legend = item.split('=')
+        layers[name] = int(legend)
+    return layers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help="KLE json path, or 'gist:<id>/<file>'")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--layers', type=parse_layers, help="layer scheme, eg. 'base=4,lower=6,raise=2,adjust=0'")
+    parser.add_argument('--config', type=Path, help='JSON list of variants, each with source, output and optional layers')
+    args = parser.parse_args()
+
+    if args.config:
+        variants = json.loads(args.config.read_text())
+        if not variants:
+            parser.error(f'{args.config} has no variants')
+    else:
+        variants = [{'source': args.source, 'output': args.output, 'layers': args.layers}]
+
+    token = None
+    if any(variant['source'].startswith('gist:') for variant in variants):
+        token = github_token()
+    for variant in variants:
+        variant['token'] = token
+
+    try:
+        setup_parser()
+        with ProcessPoolExecutor(max_workers=len(variants)) as pool:
+            for output in pool.map(_generate, variants):
+                print(f"Wrote {output}")
+    except subprocess.CalledProcessError as e:
+        print(e.stderr)
+        sys.exit(1)
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
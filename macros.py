@@ -0,0 +1,123 @@
+from supervisor import ticks_ms
+
+from kmk.keys import KC, make_key
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+from kmk.utils import Debug
+
+from keystrokes import COPY, CUT, PASTE, REDO, UNDO, Chord, mappable, reports, unmappable  # noqa: F401
+
+debug = Debug(__name__)
+
+
+class Macros(Module):
+    '''
+    Types strings and OS-aware shortcuts, streaming one HID report per main loop iteration
+    so the matrix keeps being scanned while a long snippet is being sent.
+    '''
+
+    def __init__(self):
+        self._stream = None
+        self._queue = []
+        self._held = []
+        self._kc = {}
+        # throughput stats for the last finished macro
+        self._chars = 0
+        self._started = 0
+        self.reports_sent = 0
+        self.last_cps = 0
+
+    def snippet(self, names, *items):
+        "Create a key which types `items` (strings and Chords) when pressed"
+        missing = unmappable(items)
+        if missing:
+            raise ValueError(f'snippet {names[0]} has characters with no key: {"".join(missing)!r}')
+
+        def handler(key, keyboard, *args):
+            self.send(keyboard, *items)
+            return keyboard
+
+        return make_key(names=names, on_press=handler)
+
+    def send(self, keyboard, *items):
+        "Queue `items` to be typed, after anything that is already queued. Characters with no key are skipped"
+        missing = unmappable(items)
+        if missing:
+            if debug.enabled:
+                debug('skipping characters with no key: ', repr(''.join(missing)))
+            items = mappable(items)
+        self._queue.append(items)
+        if self._stream is None:
+            self._next_stream(keyboard)
+
+    def _next_stream(self, keyboard):
+        items = self._queue.pop(0)
+        self._chars = sum(1 if isinstance(item, Chord) else len(item) for item in items)
+        self._started = ticks_ms()
+        self.reports_sent = 0
+        self._stream = reports(items, keyboard.mac_mode)
+
+    def _key(self, name):
+        key = self._kc.get(name)
+        if key is None:
+            key = self._kc[name] = getattr(KC, name)
+        return key
+
+    def _finish(self, keyboard):
+        elapsed = ticks_diff(ticks_ms(), self._started)
+        self.last_cps = self._chars * 1000 // elapsed if elapsed else self._chars * 1000
+        if debug.enabled:
+            debug(self._chars, ' chars in ', elapsed, 'ms, ', self.reports_sent, ' reports, ', self.last_cps, ' cps')
+        self._stream = None
+        if self._queue:
+            self._next_stream(keyboard)
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        return
+
+    def before_matrix_scan(self, keyboard):
+        return
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        return key
+
+    def before_hid_send(self, keyboard):
+        if self._stream is None:
+            return
+        try:
+            mods, keys = next(self._stream)
+        except StopIteration:
+            self._finish(keyboard)
+            return
+
+        pressed = keyboard.keys_pressed
+        for key in self._held:
+            pressed.discard(key)
+        self._held.clear()
+        for name in mods:
+            self._held.append(self._key(name))
+        for name in keys:
+            self._held.append(self._key(name))
+        for key in self._held:
+            pressed.add(key)
+        self.reports_sent += 1
+        keyboard.hid_pending = True
+
+    def after_hid_send(self, keyboard):
+        return
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
@@ -0,0 +1,198 @@
+from kmk.keys import AX, make_key
+from kmk.modules import Module
+from kmk.scheduler import cancel_task, create_task
+
+# direction bits
+_UP = 1
+_DOWN = 2
+_LEFT = 4
+_RIGHT = 8
+_WHEEL_UP = 16
+_WHEEL_DOWN = 32
+_WHEEL_LEFT = 64
+_WHEEL_RIGHT = 128
+_POINTER = _UP | _DOWN | _LEFT | _RIGHT
+_WHEEL = _WHEEL_UP | _WHEEL_DOWN | _WHEEL_LEFT | _WHEEL_RIGHT
+
+# sub-pixel fixed point: velocities and accumulators are in 1/256ths of a pixel
+_SHIFT = 8
+_ONE = 1 << _SHIFT
+# 1/sqrt(2) in the same fixed point, so diagonals move at the same speed as straight lines
+_DIAGONAL = 181
+# high-resolution wheel units per wheel detent (the same 120 that windows / linux use)
+_DETENT = 120
+
+
+def _detents(acc):
+    "Whole wheel detents in the high-res accumulator `acc`, truncated towards zero"
+    return acc // _DETENT if acc >= 0 else -(-acc // _DETENT)
+
+
+def build_curve(start: int, top: int, ramp_ms: int, interval_ms: int, scale: int) -> tuple:
+    '''
+    Precompute an acceleration curve as a tuple of integer per-report steps.
+
+    `start` and `top` are speeds in units per second, the curve eases in (quadratic) from
+    start to top over `ramp_ms`. Each entry is the distance to move in one report, multiplied
+    by `scale`. Only integer math is used, and this only runs once at startup, so nothing
+    per-report ever touches floats.
+    '''
+    steps = max(1, ramp_ms // interval_ms)
+    curve = []
+    for i in range(steps + 1):
+        speed = start + (top - start) * i * i // (steps * steps)
+        curve.append(speed * scale * interval_ms // 1000)
+    return tuple(curve)
+
+
+class MouseMotion(Module):
+    '''
+    Mouse keys with table-driven acceleration, sub-pixel accumulation, diagonal
+    normalization and smooth scrolling, reported at a fixed rate independent of the matrix scan.
+    '''
+
+    def __init__(
+        self,
+        report_interval_ms: int = 8,
+        pointer_start: int = 120,
+        pointer_top: int = 1600,
+        pointer_ramp_ms: int = 600,
+        wheel_start: int = 4 * _DETENT,
+        wheel_top: int = 40 * _DETENT,
+        wheel_ramp_ms: int = 800,
+    ):
+        self.report_interval_ms = report_interval_ms
+        # pointer speeds are in px/s, wheel speeds in high-res wheel units/s
+        self.pointer_curve = build_curve(pointer_start, pointer_top, pointer_ramp_ms, report_interval_ms, _ONE)
+        self.wheel_curve = build_curve(wheel_start, wheel_top, wheel_ramp_ms, report_interval_ms, 1)
+
+        self._keyboard = None
+        self._task = None
+        self._dirs = 0
+        self._pointer_tick = 0
+        self._wheel_tick = 0
+        self._acc_x = 0
+        self._acc_y = 0
+        self._acc_w = 0
+        self._acc_p = 0
+
+        for names, bit in (
+            (('MS_UP',), _UP),
+            (('MS_DOWN', 'MS_DN'), _DOWN),
+            (('MS_LEFT', 'MS_LT'), _LEFT),
+            (('MS_RIGHT', 'MS_RT'), _RIGHT),
+            (('MW_UP',), _WHEEL_UP),
+            (('MW_DOWN', 'MW_DN'), _WHEEL_DOWN),
+            (('MW_LEFT', 'MW_LT'), _WHEEL_LEFT),
+            (('MW_RIGHT', 'MW_RT'), _WHEEL_RIGHT),
+        ):
+            make_key(
+                names=names,
+                on_press=self._press_handler(bit),
+                on_release=self._release_handler(bit),
+            )
+
+    def _press_handler(self, bit):
+        def handler(key, keyboard, *args):
+            self._keyboard = keyboard
+            if not self._dirs & _POINTER and bit & _POINTER:
+                self._pointer_tick = 0
+                self._acc_x = self._acc_y = 0
+            if not self._dirs & _WHEEL and bit & _WHEEL:
+                self._wheel_tick = 0
+                self._acc_w = self._acc_p = 0
+            self._dirs |= bit
+            if self._task is None:
+                self._task = create_task(self._report, period_ms=self.report_interval_ms)
+                # move on the press itself rather than one interval later
+                self._report()
+            return keyboard
+
+        return handler
+
+    def _release_handler(self, bit):
+        def handler(key, keyboard, *args):
+            self._dirs &= ~bit
+            if not self._dirs and self._task is not None:
+                cancel_task(self._task)
+                self._task = None
+            return keyboard
+
+        return handler
+
+    def _report(self):
+        dirs = self._dirs
+        keyboard = self._keyboard
+
+        if dirs & _POINTER:
+            curve = self.pointer_curve
+            step = curve[self._pointer_tick] if self._pointer_tick < len(curve) else curve[-1]
+            self._pointer_tick += 1
+            dx = (1 if dirs & _RIGHT else 0) - (1 if dirs & _LEFT else 0)
+            dy = (1 if dirs & _DOWN else 0) - (1 if dirs & _UP else 0)
+            if dx and dy:
+                step = (step * _DIAGONAL) >> _SHIFT
+            # floor division keeps the remainder in the accumulator, so slow speeds still add up
+            self._acc_x += dx * step
+            self._acc_y += dy * step
+            x = self._acc_x >> _SHIFT
+            y = self._acc_y >> _SHIFT
+            self._acc_x -= x << _SHIFT
+            self._acc_y -= y << _SHIFT
+            if x:
+                AX.X.move(keyboard, max(-127, min(127, x)))
+            if y:
+                AX.Y.move(keyboard, max(-127, min(127, y)))
+
+        if dirs & _WHEEL:
+            curve = self.wheel_curve
+            step = curve[self._wheel_tick] if self._wheel_tick < len(curve) else curve[-1]
+            self._wheel_tick += 1
+            dw = (1 if dirs & _WHEEL_UP else 0) - (1 if dirs & _WHEEL_DOWN else 0)
+            dp = (1 if dirs & _WHEEL_RIGHT else 0) - (1 if dirs & _WHEEL_LEFT else 0)
+            # the HID report only carries whole detents, so accumulate high-res units
+            # and emit a detent each time a full one has built up
+            self._acc_w += dw * step
+            self._acc_p += dp * step
+            w = _detents(self._acc_w)
+            p = _detents(self._acc_p)
+            if w:
+                self._acc_w -= w * _DETENT
+                AX.W.move(keyboard, max(-127, min(127, w)))
+            if p:
+                self._acc_p -= p * _DETENT
+                # horizontal scroll (AC Pan), as stock MouseKeys does
+                AX.P.move(keyboard, max(-127, min(127, p)))
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        self._keyboard = keyboard
+
+    def before_matrix_scan(self, keyboard):
+        return
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        return key
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        return
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        if self._task is not None:
+            cancel_task(self._task)
+            self._task = None
+
+    # endregion
@@ -0,0 +1,63 @@
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+
+
+class PerfMonitor(Module):
+    "Measure main loop rate and worst-case loop time, over a rolling window"
+
+    def __init__(self, window_ms: int = 1000):
+        self.window_ms = window_ms
+        self._last = 0
+        self._window_start = 0
+        self._count = 0
+        self._worst = 0
+
+        # results for the last full window
+        self.scan_hz = 0
+        self.worst_loop_ms = 0
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        self._last = self._window_start = ticks_ms()
+
+    def before_matrix_scan(self, keyboard):
+        now = ticks_ms()
+        loop_ms = ticks_diff(now, self._last)
+        self._last = now
+        self._count += 1
+        if loop_ms > self._worst:
+            self._worst = loop_ms
+
+        elapsed = ticks_diff(now, self._window_start)
+        if elapsed >= self.window_ms:
+            self.scan_hz = self._count * 1000 // elapsed
+            self.worst_loop_ms = self._worst
+            self._window_start = now
+            self._count = 0
+            self._worst = 0
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        return key
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        return
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
@@ -1,5 +1,8 @@
 #!/usr/bin/env bash
 
+# font.bdf only exists once font_subset.py has been run
+shopt -s nullglob
+
 for board in BFO9000L BFO9000R; do
 
     target="/Volumes/$board"
@@ -9,7 +12,7 @@ for board in BFO9000L BFO9000R; do
         continue
     fi
 
-    rsync -rvhu --exclude kle_to_keymap.py lib kmk_firmware/.compiled/kmk *.bmp ./*.py $target
+    rsync -rvhu --exclude kle_to_keymap.py --exclude font_subset.py lib kmk_firmware/.compiled/kmk *.bmp *.bdf ./*.py $target
     cp _typing.py $target/typing.py
 
     echo "Done $target"
@@ -0,0 +1,149 @@
+# Runs instead of code.py when CircuitPython starts in safe mode.
+# Sleeps until a key is pressed, then offers a small recovery menu:
+# tap any key to move to the next option, hold any key to pick it.
+# Picking "Stay", or leaving the keys alone for TIMEOUT_MS, ends the script and leaves the board in
+# plain safe mode, with the USB drive and REPL available and code.py not running.
+import board
+import keypad
+import microcontroller
+import supervisor
+import time
+from storage import getmount
+
+from kmk.kmktime import ticks_diff
+
+import settings
+
+col_pins = (
+    board.D9,
+    board.D21,
+    board.D23,
+    board.D20,
+    board.D22,
+    board.D26,
+    board.D27,
+    board.D28,
+    board.D29,
+)
+row_pins = (
+    board.D0,
+    board.D1,
+    board.D4,
+    board.D5,
+    board.D6,
+    board.D7,
+)
+
+# keypad scans the matrix in the background, so between checks of its queue we sleep,
+# which idles the CPU instead of spinning on events.get()
+POLL_S = 0.05
+HOLD_MS = 800
+# with no key event for this long, give up and stay in safe mode
+TIMEOUT_MS = 30000
+
+# the same modes boot_handler offers, after staying put, so picking the default never reboots
+STAY = 'Stay'
+NORMAL = 'Normal'
+USB_WRITE = 'USB write'
+BOOTLOADER = 'Bootloader'
+OPTIONS = (STAY, NORMAL, USB_WRITE, BOOTLOADER)
+
+
+def render(selected):
+    "Render the menu, with a marker on the selected option"
+    lines = ['Safe mode:']
+    for index, option in enumerate(OPTIONS):
+        label = 'Stay in safe mode' if option == STAY else f'Reboot: {option}'
+        lines.append(('> ' if index == selected else '  ') + label)
+    lines.append('tap: next  hold: pick')
+    return '\n'.join(lines)
+
+
+def menu(keys, show=print, sleep=time.sleep, ticks_ms=supervisor.ticks_ms):
+    '''
+    Wait for a key, then run the menu until an option is picked, and return it.
+    Returns STAY if no key event arrives for TIMEOUT_MS, whether or not the menu was woken up.
+
+    `keys` only needs an `events` queue with get_into(), so a stub can stand in for keypad.KeyMatrix.
+    '''
+    event = keypad.Event()
+    selected = None
+    pressed_at = None
+    last_event = ticks_ms()
+    while True:
+        if not keys.events.get_into(event):
+            now = ticks_ms()
+            if pressed_at is not None and ticks_diff(now, pressed_at) >= HOLD_MS:
+                return OPTIONS[selected]
+            if pressed_at is None and ticks_diff(now, last_event) >= TIMEOUT_MS:
+                return STAY
+            sleep(POLL_S)
+            continue
+
+        last_event = ticks_ms()
+
+        if selected is None:
+            # the first key only wakes the menu up
+            if event.pressed:
+                selected = 0
+                show(render(selected))
+        elif event.pressed:
+            pressed_at = ticks_ms()
+        elif pressed_at is not None:
+            pressed_at = None
+            selected = (selected + 1) % len(OPTIONS)
+            show(render(selected))
+
+
+def oled():
+    "Set up the OLED on the left half, returning a function that shows text on it"
+    import displayio
+    import terminalio
+    from displayio import I2CDisplay  # type: ignore
+    from adafruit_display_text.label import Label
+    from adafruit_displayio_ssd1306 import SSD1306
+
+    displayio.release_displays()
+    driver = SSD1306(I2CDisplay(board.I2C(), device_address=0x3C), width=128, height=64)
+    label = Label(font=terminalio.FONT, text='', color=0xFFFFFF, x=0, y=5, line_spacing=0.85)
+    group = displayio.Group()
+    group.append(label)
+    driver.root_group = group
+
+    def show(text):
+        print(text)
+        label.text = text
+
+    return show
+
+
+def reboot(option):
+    if option == BOOTLOADER:
+        print('Rebooting into bootloader...')
+        microcontroller.on_next_reset(microcontroller.RunMode.BOOTLOADER)
+    else:
+        print(f'Rebooting into {option} mode...')
+        store = settings.load()
+        store.boot_mode = settings.BOOT_USB_WRITE if option == USB_WRITE else settings.BOOT_NORMAL
+        store.flush()
+        microcontroller.on_next_reset(microcontroller.RunMode.NORMAL)
+    microcontroller.reset()
+
+
+if __name__ == '__main__':
+    print('Running in safe mode:', supervisor.runtime.safe_mode_reason)
+    show = print
+    if str(getmount('/').label).endswith('L'):
+        try:
+            show = oled()
+        except Exception as err:
+            # a broken display must never take the recovery path down with it
+            print('No OLED:', err)
+    print('Press any key for the recovery menu...')
+    keys = keypad.KeyMatrix(row_pins, col_pins, columns_to_anodes=True)
+    option = menu(keys, show)
+    if option == STAY:
+        keys.deinit()
+        show('Staying in safe mode')
+    else:
+        reboot(option)
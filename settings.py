@@ -0,0 +1,152 @@
+'''
+Persistent settings, stored in a small versioned layout at the start of microcontroller.nvm
+
+The layout is read once into a cached copy, all reads come from the cache, and writes are
+coalesced: setters only touch the cache, and flush() writes the changed byte range back in
+a single nvm write (each nvm write costs a flash sector erase, so we do as few as possible).
+
+Layout:
+    0  boot mode (BOOT_NORMAL / BOOT_USB_WRITE), kept at offset 0 so older boot.py / u.py still agree
+    1  magic
+    2  layout version
+    3  OS mode (1 = mac, 0 = windows / linux)
+    4  display refresh rate, in Hz
+    5  flags (FLAG_*)
+'''
+
+BOOT_NORMAL = 0
+BOOT_USB_WRITE = 1
+
+FLAG_DEBUG = 1
+# use the NKRO bitmap keyboard report instead of the 6KRO boot report, read by boot.py
+FLAG_NKRO = 2
+
+# offsets
+BOOT_MODE = 0
+MAGIC = 1
+VERSION = 2
+OS_MODE = 3
+REFRESH_RATE = 4
+FLAGS = 5
+SIZE = 6
+
+_MAGIC = 0xE9
+_VERSION = 1
+DEFAULTS = bytes((BOOT_NORMAL, _MAGIC, _VERSION, 1, 10, 0))
+
+# offsets which are shared with the other half over the split link
+SYNCED = (BOOT_MODE, OS_MODE, REFRESH_RATE, FLAGS)
+
+
+class Settings:
+    "A cached view of the settings layout in `storage` (microcontroller.nvm, or any bytearray)"
+
+    def __init__(self, storage=None):
+        if storage is None:
+            import microcontroller
+
+            storage = microcontroller.nvm
+        self._storage = storage
+        self._cache = bytearray(storage[0:SIZE])
+        # what we know to be in storage, so flush() can skip unchanged bytes without re-reading nvm
+        self._stored = bytearray(self._cache)
+        # bitmask of offsets changed locally since the last sync to the other half
+        self.unsynced = 0
+        self._task = None
+
+        if self._cache[MAGIC] != _MAGIC or self._cache[VERSION] != _VERSION:
+            # blank or old-format nvm: start from defaults, but keep whatever boot mode was requested
+            boot_mode = self._cache[BOOT_MODE]
+            self._cache[:] = DEFAULTS
+            if boot_mode == BOOT_USB_WRITE:
+                self._cache[BOOT_MODE] = BOOT_USB_WRITE
+
+    def __getitem__(self, offset):
+        return self._cache[offset]
+
+    def __setitem__(self, offset, value):
+        if self._cache[offset] == value:
+            return
+        self._cache[offset] = value
+        self.unsynced |= 1 << offset
+
+    def apply(self, offset, value):
+        "Set a value received from the other half, without echoing it back across the link"
+        self._cache[offset] = value
+
+    @property
+    def dirty(self):
+        return self._cache != self._stored
+
+    def flush(self):
+        "Write any changed bytes to storage, returns the number of bytes written"
+        first = last = -1
+        for offset in range(SIZE):
+            if self._cache[offset] != self._stored[offset]:
+                if first < 0:
+                    first = offset
+                last = offset
+        if first < 0:
+            return 0
+        self._storage[first:last + 1] = self._cache[first:last + 1]
+        self._stored[first:last + 1] = self._cache[first:last + 1]
+        return last + 1 - first
+
+    def flush_later(self, delay_ms: int = 2000):
+        "Flush after `delay_ms`, so a burst of changes costs a single write"
+        if self._task is not None:
+            return
+        from kmk.scheduler import create_task
+
+        self._task = create_task(self._deferred_flush, after_ms=delay_ms)
+
+    def _deferred_flush(self):
+        self._task = None
+        self.flush()
+
+    # region named accessors
+
+    @property
+    def boot_mode(self):
+        return self._cache[BOOT_MODE]
+
+    @boot_mode.setter
+    def boot_mode(self, value):
+        self[BOOT_MODE] = value
+
+    @property
+    def mac_mode(self):
+        return bool(self._cache[OS_MODE])
+
+    @mac_mode.setter
+    def mac_mode(self, value):
+        self[OS_MODE] = 1 if value else 0
+
+    @property
+    def refresh_rate(self):
+        return self._cache[REFRESH_RATE]
+
+    @refresh_rate.setter
+    def refresh_rate(self, value):
+        self[REFRESH_RATE] = value
+
+    @property
+    def flags(self):
+        return self._cache[FLAGS]
+
+    @flags.setter
+    def flags(self, value):
+        self[FLAGS] = value
+
+    # endregion
+
+
+_settings = None
+
+
+def load():
+    "Return the settings for this board, reading nvm only the first time"
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
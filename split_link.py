@@ -0,0 +1,120 @@
+import keypad
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+from kmk.modules.split import Split
+from kmk.utils import Debug
+
+import settings
+from settings import Settings
+
+debug = Debug(__name__)
+
+# The split link only carries (key_number, pressed) pairs, and real key numbers stop at 107,
+# so key numbers from 0x80 up are used as a side channel between the halves.
+# A settings byte is sent as two events: key_number = 0x80 | offset << 4 | nibble,
+# with pressed=False for the low nibble and pressed=True for the high nibble.
+# 0xF0 and up are control codes rather than settings.
+LINK_BASE = 0x80
+_MAX_OFFSET = 5
+PING = 0xF0
+PONG = 0xF1
+# a ping not answered within this long counts as lost
+PING_TIMEOUT_MS = 1000
+
+
+class SplitLink(Module):
+    "Keep settings in sync between the two halves over the split UART, and measure link latency"
+
+    def __init__(self, split: Split, store: Settings | None = None):
+        self.split = split
+        self.settings = store or settings.load()
+        self._low = bytearray(settings.SIZE)
+        self._ping_sent = None
+        # round trip time of the last answered ping, -1 until one is answered
+        self.rtt_ms = -1
+
+    def _send(self, key_number, pressed):
+        self.split._send_uart(keypad.Event(key_number, pressed))
+
+    def send_settings(self, mask):
+        "Send every synced setting whose bit is set in `mask`"
+        for offset in settings.SYNCED:
+            if mask & (1 << offset):
+                value = self.settings[offset]
+                self._send(LINK_BASE | offset << 4 | (value & 0x0F), False)
+                self._send(LINK_BASE | offset << 4 | (value >> 4), True)
+
+    def ping(self):
+        "Ask the other half for a pong, the round trip time ends up in rtt_ms"
+        if self._ping_sent is not None:
+            if ticks_diff(ticks_ms(), self._ping_sent) < PING_TIMEOUT_MS:
+                # still waiting on the last one
+                return
+            # the last ping was never answered, so the link is down and the last rtt is stale
+            self.rtt_ms = -1
+        self._ping_sent = ticks_ms()
+        self._send(PING, True)
+
+    def _receive(self, key_number, pressed):
+        if key_number == PING:
+            self._send(PONG, True)
+            return
+        if key_number == PONG:
+            if self._ping_sent is not None:
+                self.rtt_ms = ticks_diff(ticks_ms(), self._ping_sent)
+                self._ping_sent = None
+            return
+        offset = (key_number >> 4) & 0x07
+        nibble = key_number & 0x0F
+        if offset > _MAX_OFFSET:
+            return
+        if not pressed:
+            self._low[offset] = nibble
+            return
+        value = nibble << 4 | self._low[offset]
+        if value != self.settings[offset]:
+            if debug.enabled:
+                debug('setting ', offset, ' = ', value, ' from other half')
+            self.settings.apply(offset, value)
+            self.settings.flush_later()
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        return
+
+    def before_matrix_scan(self, keyboard):
+        # this runs after Split.before_matrix_scan, so swallow any side channel
+        # update before the keyboard tries to look it up in the keymap
+        update = keyboard.secondary_matrix_update
+        if update is not None and update.key_number >= LINK_BASE:
+            keyboard.secondary_matrix_update = None
+            self._receive(update.key_number, update.pressed)
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        return key
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        if self.settings.unsynced:
+            mask = self.settings.unsynced
+            self.settings.unsynced = 0
+            self.send_settings(mask)
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
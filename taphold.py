@@ -0,0 +1,160 @@
+from supervisor import ticks_ms
+
+from kmk.keys import Key, make_argumented_key
+from kmk.kmktime import ticks_diff
+from kmk.modules import Module
+from kmk.scheduler import Task, cancel_task, create_task
+from kmk.utils import Debug
+
+debug = Debug(__name__)
+
+
+class TapHoldKey(Key):
+    "KC.TH(tap, hold, tapping_term=None): `tap` when tapped, `hold` when held, eg. KC.TH(KC.SPC, KC.MO(1))"
+
+    def __init__(self, tap: Key, hold: Key, tapping_term: int | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.tap = tap
+        self.hold = hold
+        # None uses the module's tapping_term
+        self.tapping_term = tapping_term
+        # what the key resolved to (tap or hold) while it is down, so the release goes to the same key
+        self.active = None
+
+
+class TapHold(Module):
+    '''
+    Tap-hold keys (home row mods, layer taps) that resolve as soon as the intent is known.
+
+    While a tap-hold key is undecided, every other key event is held back in a preallocated buffer.
+    It resolves to:
+        tap:  when it is released first, even if other keys were pressed in the meantime (rolls)
+        hold: as soon as another key is pressed *and* released inside it (permissive hold),
+              or when its tapping term runs out
+    so the tapping term is only ever waited out when a key is held on its own.
+    After resolving, the buffered events are replayed in order, looked up again from the keymap
+    so a layer-tap's layer applies to them.
+    '''
+
+    def __init__(self, tapping_term: int = 200, buffer_size: int = 16):
+        self.tapping_term = tapping_term
+        self.buffer_size = buffer_size
+
+        self._keyboard = None
+        # one Task, rescheduled for every press, so pressing a key doesn't allocate one
+        self._task = Task(self._timeout)
+        self._scheduled = False
+        # the undecided tap-hold key, and when it went down
+        self._pending = None
+        self._pressed_at = 0
+        # buffered events, as parallel lists so nothing is allocated per event
+        self._count = 0
+        self._keys = [None] * buffer_size
+        self._coords = [None] * buffer_size
+        self._is_pressed = bytearray(buffer_size)
+
+        # how long the last tap-hold took to resolve, for tuning tapping terms
+        self.last_resolve_ms = 0
+
+        make_argumented_key(
+            names=('TH',), constructor=TapHoldKey, on_press=self._th_pressed, on_release=self._th_released
+        )
+
+    def _buffer(self, key, is_pressed, int_coord):
+        self._keys[self._count] = key
+        self._coords[self._count] = int_coord
+        self._is_pressed[self._count] = is_pressed
+        self._count += 1
+
+    def _replay(self):
+        count = self._count
+        self._count = 0
+        for index in range(count):
+            key = self._keys[index]
+            self._keys[index] = None
+            # reprocess, so a tap-hold key among them holds back the events after it
+            self._keyboard.resume_process_key(
+                self, key, bool(self._is_pressed[index]), self._coords[index], reprocess=True
+            )
+
+    def _resolve(self, hold):
+        key = self._pending
+        self._pending = None
+        if self._scheduled:
+            cancel_task(self._task)
+            self._scheduled = False
+        self.last_resolve_ms = ticks_diff(ticks_ms(), self._pressed_at)
+        if debug.enabled:
+            debug('hold' if hold else 'tap', ' after ', self.last_resolve_ms, 'ms')
+        key.active = key.hold if hold else key.tap
+        self._keyboard.resume_process_key(self, key.active, True)
+        self._replay()
+
+    def _timeout(self):
+        # the task has already run, so it must not be cancelled again
+        self._scheduled = False
+        if self._pending is not None:
+            self._resolve(hold=True)
+
+    def _th_pressed(self, key, keyboard, *args):
+        if self._pending is not None:
+            # only reachable through a replay racing a new press, settle the older key first
+            self._resolve(hold=True)
+        self._keyboard = keyboard
+        self._pending = key
+        self._pressed_at = ticks_ms()
+        term = key.tapping_term if key.tapping_term is not None else self.tapping_term
+        create_task(self._task, after_ms=term)
+        self._scheduled = True
+
+    def _th_released(self, key, keyboard, *args):
+        if key is self._pending:
+            # released before anything decided it: a tap, with the held back keys after the press
+            self._resolve(hold=False)
+        if key.active is not None:
+            keyboard.resume_process_key(self, key.active, False)
+            key.active = None
+
+    # region Module methods
+
+    def during_bootup(self, keyboard):
+        self._keyboard = keyboard
+
+    def before_matrix_scan(self, keyboard):
+        return
+
+    def after_matrix_scan(self, keyboard):
+        return
+
+    def process_key(self, keyboard, key, is_pressed, int_coord):
+        if self._pending is None or (key is self._pending and not is_pressed):
+            return key
+
+        self._buffer(key, is_pressed, int_coord)
+        if self._count == self.buffer_size:
+            # a lot going on inside the hold, treat it as one
+            self._resolve(hold=True)
+        elif not is_pressed:
+            for index in range(self._count - 1):
+                if self._is_pressed[index] and self._coords[index] == int_coord:
+                    # permissive hold: a key was pressed and released inside the hold
+                    self._resolve(hold=True)
+                    break
+        return None
+
+    def before_hid_send(self, keyboard):
+        return
+
+    def after_hid_send(self, keyboard):
+        return
+
+    def on_powersave_enable(self, keyboard):
+        return
+
+    def on_powersave_disable(self, keyboard):
+        return
+
+    def deinit(self, keyboard):
+        return
+
+    # endregion
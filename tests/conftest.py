@@ -0,0 +1,216 @@
+'''
+Minimal fakes for the CircuitPython and KMK modules the firmware imports, so its logic can be
+tested on the host. They only implement what the modules under test actually use.
+'''
+import sys
+import types
+
+import pytest
+
+
+class Event:
+    "keypad.Event"
+
+    def __init__(self, key_number=0, pressed=True):
+        self.key_number = key_number
+        self.pressed = pressed
+
+
+class Clock:
+    "supervisor.ticks_ms, advanced by hand"
+
+    def __init__(self):
+        self.now = 0
+
+    def ticks_ms(self):
+        return self.now
+
+
+class Task:
+    "kmk.scheduler.Task"
+
+    def __init__(self, func):
+        self.func = func
+        self.due = None
+
+
+class Scheduler:
+    "kmk.scheduler, driven by Clock: run_due() runs whatever is due, like the main loop does"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.queue = []
+        # every Task ever created, so tests can check nothing is allocated per event
+        self.created = 0
+
+    def create_task(self, func, *, after_ms=0, period_ms=0):
+        task = func if isinstance(func, Task) else Task(func)
+        if task is not func:
+            self.created += 1
+        task.due = self.clock.now + after_ms
+        self.queue.append(task)
+        return task
+
+    def cancel_task(self, task):
+        if task in self.queue:
+            self.queue.remove(task)
+
+    def run_due(self):
+        for task in [task for task in self.queue if task.due <= self.clock.now]:
+            self.queue.remove(task)
+            task.func()
+
+
+class Key:
+    "kmk.keys.Key"
+
+    def __init__(self, on_press=None, on_release=None, name=None):
+        self._on_press = on_press
+        self._on_release = on_release
+        self.name = name
+
+    def __repr__(self):
+        return self.name or super().__repr__()
+
+    def on_press(self, keyboard, int_coord=None):
+        if self._on_press:
+            self._on_press(self, keyboard, None, int_coord)
+
+    def on_release(self, keyboard, int_coord=None):
+        if self._on_release:
+            self._on_release(self, keyboard, None, int_coord)
+
+
+def make_argumented_key(names, constructor, **_kwargs):
+    def argumented_key(*args, **kwargs):
+        kwargs.update(_kwargs)
+        return constructor(*args, **kwargs)
+
+    for name in names:
+        KC[name] = argumented_key
+    return argumented_key
+
+
+KC = {}
+
+
+class Debug:
+    enabled = False
+
+    def __init__(self, name):
+        pass
+
+    def __call__(self, *args):
+        pass
+
+
+class Keyboard:
+    '''
+    Just enough of KMKKeyboard to run modules' process_key chains the way KMK does: events go through
+    each module from `index` on, then to the key's handler. resume_process_key() is deferred to the
+    resume buffer, and resumed events with a coord are looked up again from the keymap.
+    Keys without handlers are recorded in `sent` as (key, pressed).
+    '''
+
+    def __init__(self, modules, keymap, coord_mapping=None):
+        self.modules = modules
+        self.keymap = keymap
+        self.coord_mapping = coord_mapping or list(range(len(keymap)))
+        self.sent = []
+        self.processed = []
+        self._resume_buffer = []
+        # coord -> key it was pressed as, for releases
+        self._coordkeys_pressed = {}
+        for module in modules:
+            module.during_bootup(self)
+
+    def resume_process_key(self, module, key, is_pressed, int_coord=None, reprocess=False):
+        index = self.modules.index(module) + (0 if reprocess else 1)
+        self._resume_buffer.append((key, is_pressed, int_coord, index))
+
+    def pre_process_key(self, key, is_pressed, int_coord=None, index=0):
+        self.processed.append((key, is_pressed, int_coord))
+        for module in self.modules[index:]:
+            key = module.process_key(self, key, is_pressed, int_coord)
+            if key is None:
+                return
+        if int_coord is not None:
+            if is_pressed:
+                self._coordkeys_pressed[int_coord] = key
+            else:
+                self._coordkeys_pressed.pop(int_coord, None)
+        if key._on_press or key._on_release:
+            if is_pressed:
+                key.on_press(self, int_coord)
+            else:
+                key.on_release(self, int_coord)
+        else:
+            self.sent.append((key, is_pressed))
+
+    def process_resume_buffer(self):
+        while self._resume_buffer:
+            key, is_pressed, int_coord, index = self._resume_buffer.pop(0)
+            if int_coord is not None:
+                if is_pressed:
+                    key = self.keymap[self.coord_mapping.index(int_coord)]
+                else:
+                    key = self._coordkeys_pressed.get(int_coord, key)
+            self.pre_process_key(key, is_pressed, int_coord, index)
+
+    def key_event(self, position, is_pressed):
+        "A physical key event at keymap `position`, and everything it resumes"
+        int_coord = self.coord_mapping[position]
+        if is_pressed:
+            key = self.keymap[position]
+        else:
+            key = self._coordkeys_pressed.get(int_coord, self.keymap[position])
+        self.pre_process_key(key, is_pressed, int_coord)
+        self.process_resume_buffer()
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    '''
+    Replace the board-only modules with fakes, returning a namespace with the clock and scheduler.
+    Firmware modules imported after this fixture are imported fresh, against the fakes.
+    '''
+    clock = Clock()
+    scheduler = Scheduler(clock)
+    KC.clear()
+    modules = {
+        'board': {f'D{pin}': pin for pin in range(30)},
+        'keypad': {'Event': Event},
+        'microcontroller': {},
+        'storage': {'getmount': lambda path: types.SimpleNamespace(label='BFO9000L')},
+        'supervisor': {'ticks_ms': clock.ticks_ms, 'runtime': types.SimpleNamespace(safe_mode_reason=None)},
+        'kmk': {},
+        'kmk.keys': {'Key': Key, 'KC': KC, 'make_argumented_key': make_argumented_key},
+        'kmk.kmktime': {
+            'ticks_diff': lambda a, b: a - b,
+            'ticks_add': lambda a, b: a + b,
+        },
+        'kmk.modules': {'Module': object},
+        'kmk.modules.split': {'Split': object},
+        'kmk.scheduler': {
+            'Task': Task,
+            'create_task': scheduler.create_task,
+            'cancel_task': scheduler.cancel_task,
+        },
+        'kmk.utils': {'Debug': Debug},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        monkeypatch.setitem(sys.modules, name, module)
+    for name in ('combos', 'safemode', 'split_link', 'taphold'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    def tick(ms, keyboard=None):
+        "Advance the clock a millisecond at a time, running due tasks and anything they resume"
+        for _ in range(ms):
+            clock.now += 1
+            scheduler.run_due()
+            if keyboard is not None:
+                keyboard.process_resume_buffer()
+
+    return types.SimpleNamespace(clock=clock, scheduler=scheduler, tick=tick, Event=Event, Key=Key, KC=KC)
@@ -0,0 +1,117 @@
+import pytest
+
+from conftest import Key, Keyboard
+
+J, K, L, X = 0, 1, 2, 3
+# a keymap position on the right half, where the coord differs from the position
+RIGHT = 5
+
+
+@pytest.fixture
+def board(fakes):
+    "A keyboard with combos j+k -> ESC, j+k+l -> TAB, l+RIGHT -> ENTER and a plain x key"
+    from combos import Combos
+
+    keys = {name: Key(name=name) for name in ('j', 'k', 'l', 'x', 'a', 'b', 'ESC', 'TAB', 'ENTER')}
+    keymap = [keys['j'], keys['k'], keys['l'], keys['x'], keys['a'], keys['b']]
+    coord_mapping = [0, 1, 2, 3, 4, 54]
+    combos = Combos([((J, K), keys['ESC']), ((J, K, L), keys['TAB']), ((L, RIGHT), keys['ENTER'])])
+    keyboard = Keyboard([combos], keymap, coord_mapping)
+    fakes.keyboard = keyboard
+    fakes.combos = combos
+    return fakes
+
+
+def play(board, *events):
+    "Play (position, pressed) events and (ms,) pauses, and return what reached the host"
+    for event in events:
+        if len(event) == 1:
+            board.tick(event[0], board.keyboard)
+        else:
+            board.keyboard.key_event(*event)
+    board.tick(1000, board.keyboard)
+    return [(key.name, pressed) for key, pressed in board.keyboard.sent]
+
+
+def test_combo_tap(board):
+    sent = play(board, (J, True), (K, True), (10,), (J, False), (K, False))
+    # j+k+l is still possible after j+k, so ESC fires once j goes up
+    assert sent == [('ESC', True), ('ESC', False)]
+
+
+def test_larger_combo_fires_without_waiting(board):
+    for position in (J, K, L):
+        board.keyboard.key_event(position, True)
+    # no larger combo is possible, so there is no timeout to wait out
+    assert [(key.name, pressed) for key, pressed in board.keyboard.sent] == [('TAB', True)]
+    sent = play(board, (J, False), (K, False), (L, False))
+    assert sent == [('TAB', True), ('TAB', False)]
+
+
+def test_larger_combo_wait(board):
+    # j+k is complete, but nothing is sent while j+k+l is still possible
+    board.keyboard.key_event(J, True)
+    board.keyboard.key_event(K, True)
+    board.tick(board.combos.timeout_ms - 1, board.keyboard)
+    assert board.keyboard.sent == []
+    board.tick(1, board.keyboard)
+    assert [(key.name, pressed) for key, pressed in board.keyboard.sent] == [('ESC', True)]
+
+
+def test_combo_on_the_right_half(board):
+    sent = play(board, (L, True), (RIGHT, True), (L, False), (RIGHT, False))
+    assert sent == [('ENTER', True), ('ENTER', False)]
+
+
+def test_roll_that_is_not_a_combo(board):
+    sent = play(board, (J, True), (X, True), (J, False), (X, False))
+    assert sent == [('j', True), ('x', True), ('j', False), ('x', False)]
+
+
+def test_roll_into_another_combo_key(board):
+    # l can't combine with j, so j is replayed and l starts a match of its own
+    sent = play(board, (J, True), (L, True), (J, False), (L, False))
+    assert [name for name, pressed in sent if pressed] == ['j', 'l']
+    assert sent.index(('j', True)) < sent.index(('l', True))
+    assert sorted(sent) == sorted([('j', True), ('l', True), ('j', False), ('l', False)])
+
+
+def test_lone_tap(board):
+    sent = play(board, (J, True), (J, False))
+    assert sent == [('j', True), ('j', False)]
+
+
+def test_hold_past_the_timeout(board):
+    sent = play(board, (J, True), (200,), (J, False))
+    assert sent == [('j', True), ('j', False)]
+    # the press is replayed as soon as the timeout runs out, not on the release
+    board.keyboard.sent.clear()
+    board.keyboard.key_event(K, True)
+    board.tick(board.combos.timeout_ms, board.keyboard)
+    assert [(key.name, pressed) for key, pressed in board.keyboard.sent] == [('k', True)]
+
+
+def test_keys_that_are_in_no_combo_pass_straight_through(board):
+    board.keyboard.key_event(X, True)
+    assert [(key.name, pressed) for key, pressed in board.keyboard.sent] == [('x', True)]
+
+
+def test_no_task_allocated_per_press(board):
+    created = board.scheduler.created
+    play(board, (J, True), (K, True), (J, False), (K, False), (J, True), (J, False))
+    assert board.scheduler.created == created
+
+
+def test_more_combos_than_fit_a_small_int(fakes):
+    from combos import WORD_BITS, Combos
+
+    keys = [Key(name=f'k{index}') for index in range(80)]
+    results = [Key(name=f'r{index}') for index in range(70)]
+    combos = Combos([((0, 10 + index), results[index]) for index in range(70)])
+    keyboard = Keyboard([combos], keys)
+    assert combos._words == 3
+    assert all(0 <= mask < 1 << WORD_BITS for mask in combos._key_masks)
+
+    keyboard.key_event(0, True)
+    keyboard.key_event(75, True)
+    assert [(key.name, pressed) for key, pressed in keyboard.sent] == [('r65', True)]
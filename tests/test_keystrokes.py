@@ -0,0 +1,95 @@
+import pytest
+
+from keystrokes import CHARS, COPY, MAX_KEYS, Chord, mappable, reports, unmappable
+
+
+class StubSink:
+    '''
+    Stands in for the HID device: records every report, the way Macros sends one per main loop.
+    Each report costs `poll_ms` of simulated time, by default the 1ms of a full speed USB poll interval,
+    which is the most a report can be sent at.
+    '''
+
+    def __init__(self, poll_ms=1):
+        self.poll_ms = poll_ms
+        self.reports = []
+        self.elapsed_ms = 0
+
+    def consume(self, stream):
+        for report in stream:
+            self.reports.append(report)
+            self.elapsed_ms += self.poll_ms
+        return self
+
+    def chars_per_second(self, chars):
+        return chars * 1000 // self.elapsed_ms
+
+    def typed(self):
+        "Replay the reports as a host would, returning the text and shortcuts they produce"
+        out = []
+        held = ()
+        by_name = {}
+        for char, (name, shifted) in CHARS.items():
+            by_name[name, shifted] = char
+        for mods, keys in self.reports:
+            for name in keys:
+                if name in held:
+                    continue
+                if 'LGUI' in mods or 'LCTL' in mods:
+                    out.append(Chord(name, 'LSFT' in mods))
+                else:
+                    out.append(by_name[name, 'LSFT' in mods])
+            held = keys
+        return out
+
+
+def test_types_text_in_order():
+    sink = StubSink().consume(reports(['Hello, world!\n'], mac_mode=False))
+    assert ''.join(sink.typed()) == 'Hello, world!\n'
+    assert sink.reports[-1] == ((), ())
+
+
+def test_repeated_characters_are_released_in_between():
+    sink = StubSink().consume(reports(['aa'], mac_mode=False))
+    assert sink.reports == [((), ('A',)), ((), ()), ((), ('A',)), ((), ())]
+
+
+def test_never_more_than_six_keys():
+    sink = StubSink().consume(reports(['abcdefghijklmnop'], mac_mode=False))
+    assert max(len(keys) for _, keys in sink.reports) == MAX_KEYS
+    assert ''.join(sink.typed()) == 'abcdefghijklmnop'
+
+
+@pytest.mark.parametrize('mac_mode, modifier', [(True, 'LGUI'), (False, 'LCTL')])
+def test_chords_follow_os_mode(mac_mode, modifier):
+    sink = StubSink().consume(reports(['x', COPY], mac_mode=mac_mode))
+    assert ((modifier,), ('C',)) in sink.reports
+
+
+def test_throughput():
+    # one report per USB poll, plus the occasional release report, for realistic text
+    text = 'The quick brown fox jumps over the lazy dog. ' * 20
+    sink = StubSink().consume(reports([text], mac_mode=False))
+    assert ''.join(sink.typed()) == text
+    assert sink.chars_per_second(len(text)) >= 700
+
+
+def test_throughput_worst_case():
+    # every character repeating needs a release report in between, halving the rate
+    text = 'a' * 100
+    sink = StubSink().consume(reports([text], mac_mode=False))
+    assert sink.chars_per_second(len(text)) == 500
+
+
+def test_throughput_with_a_slow_main_loop():
+    # one report per main loop iteration: at 5ms per loop (eg. idling), text still types at 140+ chars/s
+    text = 'The quick brown fox jumps over the lazy dog. ' * 20
+    sink = StubSink(poll_ms=5).consume(reports([text], mac_mode=False))
+    assert sink.chars_per_second(len(text)) >= 140
+
+
+def test_unmappable_characters():
+    items = ('café €5', COPY)
+    assert unmappable(items) == ['é', '€']
+    assert mappable(items) == ('caf 5', COPY)
+    assert unmappable(mappable(items)) == []
@@ -0,0 +1,101 @@
+import pytest
+
+
+class Keys:
+    "Stands in for keypad.KeyMatrix: a queue of (time_ms, pressed) events, delivered once due"
+
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = list(script)
+        self.events = self
+
+    def get_into(self, event):
+        if not self.script or self.script[0][0] > self.clock.now:
+            return False
+        _, event.pressed = self.script.pop(0)
+        event.key_number = 0
+        return True
+
+
+@pytest.fixture
+def safemode(fakes):
+    import safemode
+
+    return safemode
+
+
+def run(safemode, fakes, script):
+    shown = []
+
+    def sleep(seconds):
+        fakes.clock.now += int(seconds * 1000)
+
+    option = safemode.menu(Keys(fakes.clock, script), shown.append, sleep, fakes.clock.ticks_ms)
+    return option, shown
+
+
+def test_first_press_only_wakes(safemode, fakes):
+    # wake, then hold the first option
+    option, shown = run(safemode, fakes, [(100, True), (200, False), (300, True)])
+    assert option == safemode.OPTIONS[0]
+    assert len(shown) == 1
+    # the wake up press is never held long enough to pick anything
+    assert fakes.clock.now >= 300 + safemode.HOLD_MS
+
+
+def test_holding_the_wake_key_picks_nothing(safemode, fakes):
+    option, _ = run(safemode, fakes, [(0, True), (2000, False), (2100, True)])
+    # the hold counts from the press after waking up
+    assert fakes.clock.now >= 2100 + safemode.HOLD_MS
+    assert option == safemode.OPTIONS[0]
+
+
+def test_taps_advance_and_hold_picks(safemode, fakes):
+    script = [(0, True), (50, False)]
+    # two taps move to the third option
+    script += [(200, True), (250, False), (400, True), (450, False)]
+    script += [(600, True)]
+    option, shown = run(safemode, fakes, script)
+    assert option == safemode.OPTIONS[2]
+    assert '> ' + 'Reboot: ' + safemode.OPTIONS[2] in shown[-1]
+
+
+def test_taps_wrap_around(safemode, fakes):
+    script = [(0, True), (10, False)]
+    for tap in range(len(safemode.OPTIONS) + 1):
+        script += [(100 + tap * 100, True), (150 + tap * 100, False)]
+    script += [(1000, True)]
+    option, _ = run(safemode, fakes, script)
+    assert option == safemode.OPTIONS[1]
+
+
+def test_release_after_hold_is_not_needed(safemode, fakes):
+    # the option is picked while the key is still down, the release never has to arrive
+    option, _ = run(safemode, fakes, [(0, True), (10, False), (100, True), (100 + safemode.HOLD_MS + 500, False)])
+    assert option == safemode.OPTIONS[0]
+    assert fakes.clock.now < 100 + safemode.HOLD_MS + 500
+
+
+def test_a_tap_just_short_of_hold_is_a_tap(safemode, fakes):
+    hold = safemode.HOLD_MS
+    script = [(0, True), (10, False), (100, True), (100 + hold - 100, False), (2000, True)]
+    option, _ = run(safemode, fakes, script)
+    assert option == safemode.OPTIONS[1]
+
+
+def test_stays_in_safe_mode_without_keys(safemode, fakes):
+    option, shown = run(safemode, fakes, [])
+    assert option == safemode.STAY
+    assert shown == []
+    assert fakes.clock.now >= safemode.TIMEOUT_MS
+
+
+def test_stays_in_safe_mode_when_menu_is_left_alone(safemode, fakes):
+    option, shown = run(safemode, fakes, [(0, True), (10, False)])
+    assert option == safemode.STAY
+    assert len(shown) == 1
+
+
+def test_stay_is_the_default(safemode):
+    assert safemode.OPTIONS[0] == safemode.STAY
+    assert '> Stay in safe mode' in safemode.render(0)
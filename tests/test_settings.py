@@ -0,0 +1,81 @@
+import settings
+from settings import Settings
+
+
+class RecordingNvm(bytearray):
+    "A bytearray standing in for microcontroller.nvm, which records every write"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.writes = []
+
+    def __setitem__(self, index, value):
+        self.writes.append(index)
+        super().__setitem__(index, value)
+
+
+def blank(size=256):
+    return RecordingNvm(b'\xff' * size)
+
+
+def test_blank_nvm_gets_defaults():
+    store = Settings(blank())
+    assert bytes(store[offset] for offset in range(settings.SIZE)) == settings.DEFAULTS
+    assert store.boot_mode == settings.BOOT_NORMAL
+    assert store.dirty
+
+
+def test_migration_keeps_requested_boot_mode():
+    # before the versioned layout, nvm only held the boot mode in its first byte
+    nvm = blank()
+    nvm[0] = settings.BOOT_USB_WRITE
+    store = Settings(nvm)
+    assert store.boot_mode == settings.BOOT_USB_WRITE
+    assert store.mac_mode
+    assert store.refresh_rate == 10
+
+
+def test_existing_layout_is_read_as_is():
+    nvm = blank()
+    nvm[0 : settings.SIZE] = bytes((0, 0xE9, 1, 0, 30, settings.FLAG_NKRO))
+    store = Settings(nvm)
+    assert not store.mac_mode
+    assert store.refresh_rate == 30
+    assert store.flags == settings.FLAG_NKRO
+    assert not store.dirty
+
+
+def test_unchanged_values_are_not_written():
+    store = Settings(blank())
+    store.flush()
+    nvm = store._storage
+    nvm.writes.clear()
+
+    store.mac_mode = store.mac_mode
+    store.refresh_rate = store.refresh_rate
+    assert store.unsynced == 0
+    assert store.flush() == 0
+    assert nvm.writes == []
+
+
+def test_flush_writes_one_range():
+    store = Settings(blank())
+    store.flush()
+    nvm = store._storage
+    nvm.writes.clear()
+
+    store.mac_mode = False
+    store.flags = settings.FLAG_DEBUG
+    assert store.unsynced == (1 << settings.OS_MODE) | (1 << settings.FLAGS)
+    # offsets 3 to 5, in a single write
+    assert store.flush() == 3
+    assert nvm.writes == [slice(settings.OS_MODE, settings.FLAGS + 1)]
+    assert Settings(nvm).flags == settings.FLAG_DEBUG
+    assert not store.dirty
+
+
+def test_apply_does_not_mark_unsynced():
+    store = Settings(blank())
+    store.apply(settings.REFRESH_RATE, 20)
+    assert store.refresh_rate == 20
+    assert store.unsynced == 0
@@ -0,0 +1,92 @@
+import pytest
+
+import settings
+from settings import Settings
+
+
+class FakeSplit:
+    "Records what would go over the UART"
+
+    def __init__(self):
+        self.sent = []
+
+    def _send_uart(self, event):
+        self.sent.append(event)
+
+
+@pytest.fixture
+def split_link(fakes):
+    import split_link
+
+    return split_link
+
+
+def halves(split_link):
+    left = split_link.SplitLink(FakeSplit(), Settings(bytearray(b'\xff' * 8)))
+    right = split_link.SplitLink(FakeSplit(), Settings(bytearray(b'\xff' * 8)))
+    return left, right
+
+
+def deliver(sender, receiver):
+    for event in sender.split.sent:
+        receiver._receive(event.key_number, event.pressed)
+    sender.split.sent.clear()
+
+
+def test_settings_round_trip(split_link):
+    left, right = halves(split_link)
+    left.settings.mac_mode = False
+    left.settings.refresh_rate = 0xA5
+    left.settings.flags = settings.FLAG_DEBUG | settings.FLAG_NKRO
+    left.send_settings(left.settings.unsynced)
+
+    # two events per setting, all in the side channel above the real key numbers
+    assert len(left.split.sent) == 6
+    assert all(event.key_number >= split_link.LINK_BASE for event in left.split.sent)
+
+    deliver(left, right)
+    assert not right.settings.mac_mode
+    assert right.settings.refresh_rate == 0xA5
+    assert right.settings.flags == settings.FLAG_DEBUG | settings.FLAG_NKRO
+    # received settings are not echoed back
+    assert right.settings.unsynced == 0
+
+
+def test_every_byte_value_survives(split_link):
+    left, right = halves(split_link)
+    for value in range(256):
+        left.settings.refresh_rate = value
+        left.send_settings(1 << settings.REFRESH_RATE)
+        deliver(left, right)
+        assert right.settings.refresh_rate == value
+
+
+def test_ping_is_answered(split_link):
+    left, right = halves(split_link)
+    left.ping()
+    deliver(left, right)
+    assert [event.key_number for event in right.split.sent] == [split_link.PONG]
+    deliver(right, left)
+    assert left.rtt_ms == 0
+
+
+def test_lost_ping_clears_rtt(split_link, fakes):
+    left, right = halves(split_link)
+    left.ping()
+    fakes.clock.now = 7
+    deliver(left, right)
+    deliver(right, left)
+    assert left.rtt_ms == 7
+
+    # the other half goes away: the next ping is never answered
+    left.ping()
+    left.split.sent.clear()
+    fakes.clock.now += split_link.PING_TIMEOUT_MS - 1
+    left.ping()
+    assert left.rtt_ms == 7
+    assert left.split.sent == []
+
+    fakes.clock.now += 1
+    left.ping()
+    assert left.rtt_ms == -1
+    assert [event.key_number for event in left.split.sent] == [split_link.PING]
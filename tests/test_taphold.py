@@ -0,0 +1,122 @@
+import pytest
+
+from conftest import Key, Keyboard
+
+SPC_LOWER, A_CTRL, X, Y, J, K, Z_ALT = 0, 1, 2, 3, 4, 5, 6
+
+
+@pytest.fixture
+def board(fakes):
+    '''
+    A keyboard set up like kb.py, combos ahead of tap-hold, with:
+    Space/LSFT (default term), A/LCTL (tapping_term=300), plain x and y, Z/LALT,
+    and combos j+k -> ESC and Z/LALT+x -> y
+    '''
+    from combos import Combos
+    from taphold import TapHold
+
+    taphold = TapHold(tapping_term=200)
+    keys = {name: Key(name=name) for name in ('SPC', 'LSFT', 'A', 'LCTL', 'x', 'y', 'j', 'k', 'ESC', 'Z', 'LALT')}
+    TH = fakes.KC['TH']
+    keymap = [
+        TH(keys['SPC'], keys['LSFT']),
+        TH(keys['A'], keys['LCTL'], tapping_term=300),
+        keys['x'],
+        keys['y'],
+        keys['j'],
+        keys['k'],
+        TH(keys['Z'], keys['LALT']),
+    ]
+    combos = Combos([((J, K), keys['ESC']), ((Z_ALT, X), keys['y'])])
+    fakes.keyboard = Keyboard([combos, taphold], keymap)
+    fakes.taphold = taphold
+    return fakes
+
+
+def play(board, *events):
+    "Play (position, pressed) events and (ms,) pauses, and return what reached the host"
+    for event in events:
+        if len(event) == 1:
+            board.tick(event[0], board.keyboard)
+        else:
+            board.keyboard.key_event(*event)
+    board.tick(1000, board.keyboard)
+    return [(key.name, pressed) for key, pressed in board.keyboard.sent]
+
+
+def test_tap(board):
+    sent = play(board, (SPC_LOWER, True), (50,), (SPC_LOWER, False))
+    assert sent == [('SPC', True), ('SPC', False)]
+    assert board.taphold.last_resolve_ms == 50
+
+
+def test_roll_is_a_tap(board):
+    # space goes up before x does, so it was a roll, not a hold
+    sent = play(board, (SPC_LOWER, True), (20,), (Y, True), (20,), (SPC_LOWER, False), (Y, False))
+    assert sent == [('SPC', True), ('y', True), ('SPC', False), ('y', False)]
+
+
+def test_permissive_hold(board):
+    sent = play(board, (SPC_LOWER, True), (Y, True), (30,), (Y, False), (SPC_LOWER, False))
+    assert sent == [('LSFT', True), ('y', True), ('y', False), ('LSFT', False)]
+    # resolved on y's release, not on the tapping term
+    assert board.taphold.last_resolve_ms == 30
+
+
+def test_hold_on_timeout(board):
+    board.keyboard.key_event(SPC_LOWER, True)
+    board.tick(199, board.keyboard)
+    assert board.keyboard.sent == []
+    sent = play(board, (1,), (SPC_LOWER, False))
+    assert sent == [('LSFT', True), ('LSFT', False)]
+    assert board.taphold.last_resolve_ms == 200
+
+
+def test_key_after_the_timeout_is_not_held_back(board):
+    sent = play(board, (SPC_LOWER, True), (250,), (Y, True), (Y, False), (SPC_LOWER, False))
+    assert sent == [('LSFT', True), ('y', True), ('y', False), ('LSFT', False)]
+
+
+def test_per_key_tapping_term(board):
+    # 250ms is past the default term, but not A/LCTL's 300ms
+    sent = play(board, (A_CTRL, True), (250,), (A_CTRL, False))
+    assert sent == [('A', True), ('A', False)]
+    board.keyboard.sent.clear()
+    sent = play(board, (A_CTRL, True), (300,), (A_CTRL, False))
+    assert sent == [('LCTL', True), ('LCTL', False)]
+
+
+def test_key_held_across_the_tap_hold(board):
+    # y was down before space, so its release inside the hold isn't a permissive hold
+    sent = play(board, (Y, True), (SPC_LOWER, True), (Y, False), (SPC_LOWER, False))
+    assert sent == [('y', True), ('SPC', True), ('y', False), ('SPC', False)]
+
+
+def test_second_tap_hold_inside_the_first(board):
+    # A/LCTL is pressed and released inside Space/LSFT: shift is held, and A/LCTL is a tap
+    sent = play(board, (SPC_LOWER, True), (A_CTRL, True), (A_CTRL, False), (SPC_LOWER, False))
+    assert sent == [('LSFT', True), ('A', True), ('A', False), ('LSFT', False)]
+
+
+def test_combo_inside_a_hold(board):
+    # combos come first, so j+k reaches tap-hold as ESC, which counts as a key pressed and released
+    sent = play(board, (SPC_LOWER, True), (J, True), (K, True), (J, False), (K, False), (SPC_LOWER, False))
+    assert sent == [('LSFT', True), ('ESC', True), ('ESC', False), ('LSFT', False)]
+
+
+def test_tap_hold_key_in_a_combo(board):
+    # combos see the physical tap-hold key before tap-hold does, so it can be a combo member
+    sent = play(board, (Z_ALT, True), (X, True), (Z_ALT, False), (X, False))
+    assert sent == [('y', True), ('y', False)]
+
+
+def test_tap_hold_key_in_a_combo_still_taps(board):
+    # on its own, the combo member tap-hold is replayed once the combo times out, then tapped
+    sent = play(board, (Z_ALT, True), (60,), (Z_ALT, False))
+    assert sent == [('Z', True), ('Z', False)]
+
+
+def test_no_task_allocated_per_press(board):
+    created = board.scheduler.created
+    play(board, (SPC_LOWER, True), (SPC_LOWER, False), (A_CTRL, True), (400,), (A_CTRL, False))
+    assert board.scheduler.created == created
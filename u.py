@@ -1,18 +1,31 @@
 # utility functions, used in the REPL
 import microcontroller
+import debounce
 from kb import Ergo9000
+import settings
 
 
 def reboot():
-    microcontroller.nvm[0] = 1  # tell boot.py to enable USB drive  # type: ignore
+    settings.load().boot_mode = settings.BOOT_USB_WRITE  # tell boot.py to enable USB drive
+    settings.load().flush()
     microcontroller.reset()
 
 
 def safe_mode():
-    microcontroller.nvm[0] = 0  # tell boot.py to boot normally  # type: ignore
+    settings.load().boot_mode = settings.BOOT_NORMAL  # tell boot.py to boot normally
+    settings.load().flush()
     microcontroller.reset()
 
 
+def chatter():
+    "print every key (by keymap position) that has chattered since the keyboard was started, worst first"
+    if debounce.active is None:
+        print("the keyboard isn't running, start it with main.k.go() first")
+        return
+    for position, count in debounce.active.chatter_report(Ergo9000.coord_mapping):
+        print(f"{position:>3}: {count}")
+
+
 _kb = None
 
 